@@ -0,0 +1,23 @@
+import warnings
+
+import pytest
+
+from sakkara.model import build
+from synthetic import hierarchical_df, hierarchical_likelihood, cardinalities
+
+
+@pytest.mark.parametrize('nan_fraction', [0., .1])
+@pytest.mark.parametrize('depth', [1, 3])
+@pytest.mark.parametrize('n_rows', [10 ** 3, 10 ** 4, 10 ** 5])
+def test_build(benchmark, n_rows, depth, nan_fraction):
+    df = hierarchical_df(n_rows, cardinalities(depth), nan_fraction=nan_fraction)
+
+    def setup():
+        # Components can only be built once, create new ones for each round
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return (df, hierarchical_likelihood(df)), {}
+
+    model = benchmark.pedantic(build, setup=setup, rounds=3)
+
+    assert len(model.free_RVs) == 2 * depth + 2
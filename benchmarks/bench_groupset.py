@@ -0,0 +1,15 @@
+import pytest
+
+from sakkara.relation.groupset import init
+from synthetic import hierarchical_df, cardinalities
+
+
+@pytest.mark.parametrize('depth', [1, 3])
+@pytest.mark.parametrize('n_rows', [10 ** 4, 10 ** 5, 10 ** 6])
+def test_init(benchmark, n_rows, depth):
+    df = hierarchical_df(n_rows, cardinalities(depth), n_twins=depth)
+    columns = [c for c in df.columns if c not in ('x', 'y')]
+
+    gs = benchmark(init, df, columns, builtin_groups=True)
+
+    assert gs['global'] in gs['level0'].parents
@@ -0,0 +1,30 @@
+import warnings
+
+import pytest
+
+from sakkara.model import build
+from synthetic import hierarchical_df, hierarchical_likelihood, cardinalities
+
+N_EVALUATIONS = 100
+
+
+@pytest.fixture(params=[(10 ** 4, 1), (10 ** 4, 3), (10 ** 5, 3)], ids=lambda p: f'rows={p[0]}-depth={p[1]}')
+def model(request):
+    n_rows, depth = request.param
+    df = hierarchical_df(n_rows, cardinalities(depth))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return build(df, hierarchical_likelihood(df))
+
+
+def evaluate(fct, point):
+    for _ in range(N_EVALUATIONS):
+        fct(point)
+
+
+def test_logp(benchmark, model):
+    benchmark(evaluate, model.compile_logp(), model.initial_point())
+
+
+def test_dlogp(benchmark, model):
+    benchmark(evaluate, model.compile_dlogp(), model.initial_point())
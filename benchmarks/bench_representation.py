@@ -0,0 +1,55 @@
+import numpy as np
+import pytensor.tensor as pt
+import pytest
+
+from sakkara.relation.group import Group
+from sakkara.relation.representation import MinimalTensorRepresentation
+
+N_MEMBERS = 1000
+
+
+def hierarchy(n_obs: int):
+    """
+    Create a two level hierarchy directly from groups, without the relation discovery of
+    :func:`sakkara.relation.groupset.init`
+    """
+    rng = np.random.default_rng(100)
+    group = Group('group', np.arange(N_MEMBERS))
+    obs = Group('obs', np.arange(n_obs))
+    obs.add_parent(group, rng.integers(0, N_MEMBERS, n_obs))
+    group.add_child(obs)
+    return group, obs
+
+
+@pytest.mark.parametrize('n_obs', [10 ** 5, 10 ** 6, 10 ** 7])
+def test_map_to_obs(benchmark, n_obs):
+    group, obs = hierarchy(n_obs)
+    source = MinimalTensorRepresentation(group)
+    target = MinimalTensorRepresentation(obs)
+    values = pt.vector('values')
+
+    mapped = benchmark(source.map, values, target)
+
+    assert mapped.eval({values: np.arange(N_MEMBERS, dtype=values.dtype)}).shape == (n_obs,)
+
+
+@pytest.mark.parametrize('n_cells', [10 ** 5, 10 ** 6, 10 ** 7])
+def test_map_to_combination(benchmark, n_cells):
+    # Group of cells crossed by two parents, mapped onto the representation of its parents
+    rows = Group('row', np.arange(N_MEMBERS))
+    columns = Group('column', np.arange(n_cells // N_MEMBERS))
+    cells = Group('cell', np.arange(n_cells))
+    rng = np.random.default_rng(100)
+    cell_order = rng.permutation(n_cells)
+    cells.add_parent(rows, cell_order // len(columns))
+    cells.add_parent(columns, cell_order % len(columns))
+    rows.add_child(cells)
+    columns.add_child(cells)
+
+    source = MinimalTensorRepresentation(cells)
+    target = MinimalTensorRepresentation(rows, columns)
+    values = pt.vector('values')
+
+    mapped = benchmark(source.map, values, target)
+
+    assert mapped.eval({values: np.arange(n_cells, dtype=values.dtype)}).shape == (N_MEMBERS, n_cells // N_MEMBERS)
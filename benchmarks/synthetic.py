@@ -0,0 +1,63 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pymc as pm
+
+from sakkara.model import DistributionComponent as DC, Likelihood, data_components
+
+
+def hierarchical_df(n_rows: int, cardinalities: Sequence[int] = (10, 100), n_twins: int = 0,
+                    nan_fraction: float = 0., seed: int = 100) -> pd.DataFrame:
+    """
+    Generate a synthetic dataframe with nested group columns and a linear response.
+
+    :param n_rows: Number of rows.
+    :param cardinalities: Number of members of each level, from highest to lowest level. Each value should divide the
+        next one, so that each level is nested in the previous.
+    :param n_twins: Number of twin columns, i.e., columns with a one-to-one relation to one of the levels.
+    :param nan_fraction: Fraction of rows with NaN response.
+    :param seed: Seed of the random generator.
+
+    :return: Dataframe with group columns `level0`, `level1`, ..., twin columns `twin0`, `twin1`, ..., and numeric
+        columns `x` and `y`.
+    """
+    rng = np.random.default_rng(seed)
+    leaf = rng.integers(0, cardinalities[-1], n_rows)
+
+    df = pd.DataFrame({f'level{i}': leaf * c // cardinalities[-1] for i, c in enumerate(cardinalities)})
+    for i in range(n_twins):
+        df[f'twin{i}'] = 'm' + df[f'level{i % len(cardinalities)}'].astype(str)
+
+    df['x'] = rng.normal(size=n_rows)
+    coefficients = sum(rng.normal(size=c)[df[f'level{i}'].values] for i, c in enumerate(cardinalities))
+    df['y'] = coefficients * df['x'] + rng.normal(scale=.1, size=n_rows)
+    df.loc[rng.random(n_rows) < nan_fraction, 'y'] = float('nan')
+
+    return df
+
+
+def hierarchical_likelihood(df: pd.DataFrame) -> Likelihood:
+    """
+    Create a likelihood with one coefficient per level of a dataframe from :func:`hierarchical_df`, each centered on
+    the coefficient of the level above.
+    """
+    data = data_components(df)
+    levels = [c for c in df.columns if c.startswith('level')]
+
+    coefficient = DC(pm.Normal, name='coeff_global')
+    for level in levels:
+        coefficient = DC(pm.Normal, name=f'coeff_{level}', group=level, mu=coefficient,
+                         sigma=DC(pm.HalfNormal, name=f'sigma_{level}'))
+
+    masks = dict(nan_param_mask={'mu': 0, 'sigma': 1}, nan_data_mask=0) if np.any(np.isnan(df['y'])) else dict()
+
+    return Likelihood(pm.Normal, mu=coefficient * data['x'], sigma=DC(pm.HalfNormal, name='sigma'),
+                      observed=data['y'], **masks)
+
+
+def cardinalities(depth: int) -> Tuple[int, ...]:
+    """
+    Cardinalities of a hierarchy with the given depth, ten times as many members on each level.
+    """
+    return tuple(10 ** (i + 1) for i in range(depth))
@@ -4,7 +4,9 @@ from sakkara.model.composable.hierarchical.distribution import DistributionCompo
 from sakkara.model.composable.hierarchical.reshaper import Reshaper
 from sakkara.model.deterministic import DeterministicComponent
 from sakkara.model.fixed.base import UnrepeatableComponent
-from sakkara.model.fixed.data import DataComponent, data_components
+from sakkara.model.fixed.data import DataComponent, FileBackedArray, data_components, ingest_chunks
 from sakkara.model.function.base import FunctionComponent
 from sakkara.model.function.wrapper import f_
-from sakkara.model.utils import build
+from sakkara.model.handle import ModelHandle
+from sakkara.model.parallel import build_many, fit_many
+from sakkara.model.utils import build, clone, init_groupset
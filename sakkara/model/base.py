@@ -1,6 +1,9 @@
 import abc
-from typing import Set, Optional, Any
+from typing import Set, Optional, Any, List, Callable, Hashable
 
+import numpy as np
+
+from sakkara.profiler import record
 from sakkara.relation.groupset import GroupSet
 
 
@@ -28,6 +31,45 @@ class ModelComponent:
         """
         raise NotImplementedError
 
+    def get_subcomponents(self) -> List['ModelComponent']:
+        """
+        Get the components directly underlying this component.
+        """
+        return []
+
+    def name_subcomponents(self) -> None:
+        """
+        Assign names to the unnamed subcomponents, derived from the name of this component.
+        """
+        pass
+
+    def validate(self) -> None:
+        """
+        Check that the component can be built, performed after naming and before building any component.
+        """
+        pass
+
+    def get_structure(self, canonical: Callable[['ModelComponent'], 'ModelComponent']) -> Optional[Hashable]:
+        """
+        Get a key that is equal for structurally identical components, i.e., components that build identical
+        variables. Such components are only built once.
+
+        :param canonical: Callable giving the component that is built in place of a (sub)component.
+
+        :return: The key, or `None` if the component must always be built on its own.
+        """
+        return None
+
+    def share_build(self, other: 'ModelComponent') -> None:
+        """
+        Use the representation and variable of a built, structurally identical, component instead of building this
+        component.
+
+        :param other: The built component.
+        """
+        self.representation = other.representation
+        self.variable = other.variable
+
     @abc.abstractmethod
     def build_variable(self) -> None:
         """
@@ -75,9 +117,14 @@ class ModelComponent:
         :meth:`ModelComponent.prebuild`, :meth:`ModelComponent.build_representation`, and
         :meth:`ModelComponent.build_variable`
         """
-        self.prebuild(groupset)
-        self.build_representation(groupset)
-        self.build_variable()
+        description = f'{type(self).__name__}({self.get_name()})'
+        with record('prebuild', description):
+            self.prebuild(groupset)
+        with record('build_representation', description):
+            self.build_representation(groupset)
+        with record('build_variable', description) as entry:
+            self.build_variable()
+            entry.size = int(np.prod(self.representation.get_shape()))
 
     @abc.abstractmethod
     def __add__(self, other: Any) -> 'ModelComponent':
@@ -1,7 +1,7 @@
 import abc
 from abc import ABC
 from functools import cache
-from typing import Generic, Optional, Union, Tuple, Any, Dict, Set, TypeVar
+from typing import Generic, Optional, Union, Tuple, Any, Dict, Set, TypeVar, List
 
 from sakkara.model.base import ModelComponent
 from sakkara.model.minibatch import MinibatchComponent
@@ -54,10 +54,17 @@ class Composable(MathOpBase, ABC, Generic[S, T]):
     def set_name(self, name: str) -> None:
         self.name = name
 
-    def build_components(self, groupset: GroupSet) -> None:
+    def get_subcomponents(self) -> List[ModelComponent]:
+        return list(self.subcomponents.values())
+
+    def name_subcomponents(self) -> None:
         for param_name, component in self.subcomponents.items():
             if component.get_name() is None:
                 component.set_name(f'{param_name}_{self.get_name()}')
+
+    def build_components(self, groupset: GroupSet) -> None:
+        self.name_subcomponents()
+        for component in self.subcomponents.values():
             if component.variable is None:
                 component.build(groupset)
 
@@ -72,32 +72,48 @@ class GroupComponent(Composable[Tuple[str, ...], T], ABC):
         if not all(m in self.subcomponents for m in member_tuples):
             raise ValueError('All member of group component must be specified.')
 
-        # Get the member array for each group, re-order with mapping
-        base_members = self.base_representation.get_members()
-        base_members_reordered = tuple(
-            map(lambda x: self.base_representation.map(x, self.representation), base_members))
-
-        # Create array for adding
-        member_tensor = np.empty(len(member_tuples), dtype=object)
-
-        for i, member_tuple in enumerate(member_tuples):
-            # Get the component
-            component = self.subcomponents[member_tuple]
-            # Get the variable, re-order to the representation and flatten
-            member_variable = component.representation.map(component.variable, self.representation).ravel()
-
-            # Mask all the entries of the group variable (with self.representation) corresponding to this member
-            mask = np.ones(np.prod(self.representation.get_shape()), dtype=bool)
-            for j, m in enumerate(member_tuple):
-                mask *= base_members_reordered[j].ravel() == m
-
-            member_tensor[i] = member_variable[mask]
-
-        # Stack the member-wise variables into the group variable
+        # Several members may share the same component, only include each distinct component once
+        member_components = [self.subcomponents[m] for m in member_tuples]
+        distinct_components = {}
+        offset = 0
+        for component in member_components:
+            if id(component) not in distinct_components:
+                distinct_components[id(component)] = (offset, component)
+                offset += int(np.prod(component.representation.get_shape()))
+
+        # Concatenate the flattened variables of the distinct components, and pick the entry of the member's component
+        # for each cell of the representation in a single gather
         # NOTE! We assume that self.base_representation correspond to the first groups of self.representation
         # This might not be the case if a child of a group in self.base_representation is included in
         # self.components_representation (Hence, this is not supported)
-        full_tensor = pt.stack(member_tensor.tolist()).ravel().reshape(self.representation.get_shape())
+        n_cells = int(np.prod(self.representation.get_shape()))
+        n_member_cells = n_cells // len(member_tuples)
+        index = np.empty(n_cells, dtype=np.int64)
+        for i, component in enumerate(member_components):
+            cells = slice(i * n_member_cells, (i + 1) * n_member_cells)
+            index[cells] = distinct_components[id(component)][0] + get_flat_positions(component, self.representation,
+                                                                                     cells)
+
+        concatenated = pt.concatenate([pt.as_tensor(c.variable).ravel() for _, c in distinct_components.values()])
+        full_tensor = concatenated[index].reshape(self.representation.get_shape())
 
         # Create the group variable, wrapped with Deterministic
         self.variable = pm.Deterministic(name=self.name, var=full_tensor, dims=self.dims())
+
+
+def get_flat_positions(component: ModelComponent, representation: MinimalTensorRepresentation,
+                       cells: slice) -> npt.NDArray[int]:
+    """
+    Get the positions in the flattened variable of a component, that are mapped to a range of cells of a
+    representation.
+
+    :param component: The built component.
+    :param representation: Representation the component is mapped to.
+    :param cells: Range of cells, in the flattened representation.
+
+    :return: Position in the flattened variable of the component, for each of the cells.
+    """
+    if len(component.representation.get_groups()) == 0:
+        return np.zeros(cells.stop - cells.start, dtype=np.int64)
+    indices = component.representation.get_mapping_indices(representation)
+    return np.ravel_multi_index(tuple(np.ravel(i)[cells] for i in indices), component.representation.get_shape())
@@ -1,12 +1,13 @@
 from abc import ABC
 from typing import Any, Dict, Union, Tuple, Optional
 
+import pymc as pm
 import pytensor.tensor as pt
 
 from sakkara.model.base import ModelComponent
 from sakkara.model.composable.base import Composable, T
-from sakkara.relation.groupset import GroupSet
-from sakkara.relation.representation import MinimalTensorRepresentation
+from sakkara.relation.groupset import GroupSet, get_coords
+from sakkara.relation.representation import MinimalTensorRepresentation, Representation
 
 
 class HierarchicalComponent(Composable[str, T], ABC):
@@ -19,10 +20,14 @@ class HierarchicalComponent(Composable[str, T], ABC):
     :param group: Group of which the component is defined for.
     :param members: Subset of members of column the component is defined for.
     :param subcomponents: Dict of underlying :class:`ModelComponent` objects.
+    :param sparse: Define the component only for the combinations of members of its groups that occur in the data,
+        see :meth:`sakkara.relation.groupset.GroupSet.get_combination`, rather than for all combinations.
     """
 
-    def __init__(self, name: Optional[str], group: Optional[Union[str, Tuple[str, ...]]], subcomponents: Dict[str, T]):
+    def __init__(self, name: Optional[str], group: Optional[Union[str, Tuple[str, ...]]], subcomponents: Dict[str, T],
+                 sparse: bool = False):
         super().__init__(name, group, subcomponents)
+        self.sparse = sparse
 
     def __getitem__(self, item: Any) -> ModelComponent:
         return self.subcomponents[item]
@@ -43,13 +48,30 @@ class HierarchicalComponent(Composable[str, T], ABC):
             if tuple(map(str, self.representation.groups)) != self.group:
                 raise ValueError('Groups are not a minimal')
 
+            if self.sparse and len(self.group) > 1:
+                combination = groupset.get_combination(self.group)
+                self.representation = MinimalTensorRepresentation(groupset['global'], combination)
+
+                model = pm.Model.get_context(error_if_none=False)
+                if model is not None and combination.name not in model.coords:
+                    model.add_coord(combination.name, get_coords(combination))
+
     def get_built_components(self) -> Dict[str, pt.Variable]:
-        built_components = {}
-        for key, comp in self.subcomponents.items():
-            intermediate_repr = MinimalTensorRepresentation(*self.representation.get_groups(),
-                                                            *comp.representation.get_groups())
+        return {key: self.map_component(comp, self.representation) for key, comp in self.subcomponents.items()}
+
+    @staticmethod
+    def map_component(component: ModelComponent, representation: Representation) -> pt.Variable:
+        """
+        Map the variable of a built component to a representation, through an intermediate representation with the
+        groups of both.
+
+        :param component: The built component.
+        :param representation: Representation to map the variable of the component to.
 
-            intermediate_var = comp.representation.map(comp.variable, intermediate_repr)
-            built_components[key] = intermediate_repr.map(intermediate_var, self.representation)
+        :return: The mapped variable.
+        """
+        intermediate_repr = MinimalTensorRepresentation(*representation.get_groups(),
+                                                        *component.representation.get_groups())
 
-        return built_components
+        intermediate_var = component.representation.map(component.variable, intermediate_repr)
+        return intermediate_repr.map(intermediate_var, representation)
@@ -1,10 +1,32 @@
 from abc import ABC
-from typing import Callable, Optional, Union, Tuple, Any, Iterable
+from typing import Callable, Dict, Optional, Union, Tuple, Any, Iterable
+
+import numpy as np
+import pymc as pm
 
 from sakkara.model.base import ModelComponent
 from sakkara.model.composable.base import T
 from sakkara.model.composable.hierarchical.base import HierarchicalComponent
-from sakkara.model.fixed.base import UnrepeatableComponent
+from sakkara.model.fixed.base import FixedValueComponent, UnrepeatableComponent
+from sakkara.relation.groupset import GroupSet
+
+# Location and scale parameters of location-scale families, whose variables can be built as location + scale * offset
+LOCATION_SCALE: Dict[Callable, Tuple[str, str]] = {
+    pm.Normal: ('mu', 'sigma'),
+    pm.StudentT: ('mu', 'sigma'),
+    pm.Cauchy: ('alpha', 'beta'),
+    pm.Laplace: ('mu', 'b'),
+    pm.Logistic: ('mu', 's'),
+    pm.Gumbel: ('mu', 'beta'),
+}
+
+# Alternative parameters of the scale, e.g., the precision, which the non-centered form does not support
+ALTERNATIVE_SCALES = ('tau', 'lam')
+
+PARAMETERIZATIONS = ('centered', 'noncentered', 'auto')
+
+# With the auto parameterization, the non-centered form is used below this number of observations per element
+AUTO_OBSERVATIONS_PER_ELEMENT = 10
 
 
 class DistributionComponent(HierarchicalComponent[T], ABC):
@@ -23,6 +45,20 @@ class DistributionComponent(HierarchicalComponent[T], ABC):
 
     :param members: Subset of members of column the component is defined for, defaults to None
     :type members: Iterable[Any]
+
+    :param sparse: Define the component only for the combinations of members of its groups that occur in the data,
+        rather than for all combinations, defaults to False. Use for crossed groups where most combinations are absent,
+        e.g., `group=('store', 'week')`.
+    :type sparse: bool
+
+    :param parameterization: Either `centered`, where the distribution is used directly, `noncentered`, where the
+        variable is built as `location + scale * offset` with an offset from the standardized distribution, or `auto`,
+        which uses the non-centered form when the location or scale is random and there are fewer than 10
+        observations per element of the variable, defaults to `centered`. The non-centered form avoids divergences in
+        hierarchies with little data per group, and is only available for location-scale families (`pm.Normal`,
+        `pm.StudentT`, `pm.Cauchy`, `pm.Laplace`, `pm.Logistic` and `pm.Gumbel`). The offset is registered as
+        `<name>_offset`, and the variable as a deterministic.
+    :type parameterization: str
     
     :param \**subcomponents: Underlying components/objects passed as parameters to PyMC distribution, should correspond
     to keyword of `generator`
@@ -36,16 +72,55 @@ class DistributionComponent(HierarchicalComponent[T], ABC):
         from sakkara.model import DistributionComponent as DC
         sigma_comp = DC(pm.HalfNormal)
         n = DC(pm.Normal, sigma=sigma_comp)
+        n_room = DC(pm.Normal, group='room', mu=n, sigma=sigma_comp, parameterization='noncentered')
 
     """
 
     def __init__(self, generator: Callable, name: Optional[str] = None, group: Union[str, Tuple[str, ...]] = None,
-                 **subcomponents: Any):
+                 sparse: bool = False, parameterization: str = 'centered', **subcomponents: Any):
         super().__init__(name, group,
                          subcomponents={k: v if isinstance(v, ModelComponent) else UnrepeatableComponent(v) for k, v in
-                                        subcomponents.items()})
+                                        subcomponents.items()}, sparse=sparse)
         self.generator = generator
 
+        if parameterization not in PARAMETERIZATIONS:
+            raise ValueError(f'Parameterization must be one of {PARAMETERIZATIONS}, got {parameterization}')
+        if parameterization == 'noncentered' and not self.is_location_scale():
+            raise ValueError('Non-centered parameterization requires a location-scale family given by its location and'
+                             f' scale, one of {[g.__name__ for g in LOCATION_SCALE]}')
+        self.parameterization = parameterization
+        self.noncentered = parameterization == 'noncentered'
+
+    def is_location_scale(self) -> bool:
+        return self.generator in LOCATION_SCALE and not any(k in self.subcomponents for k in ALTERNATIVE_SCALES)
+
+    def build_representation(self, groupset: GroupSet) -> None:
+        super().build_representation(groupset)
+        if self.parameterization == 'auto':
+            self.noncentered = self.is_location_scale() and self.is_weakly_informed(groupset)
+
+    def is_weakly_informed(self, groupset: GroupSet) -> bool:
+        """
+        Check if the variable has a random location or scale, and few observations per element, such that the posterior
+        is dominated by the hierarchical prior.
+        """
+        if 'obs' not in groupset.groups:
+            return False
+        random_parameters = any(k in self.subcomponents and not isinstance(self.subcomponents[k], FixedValueComponent)
+                                for k in LOCATION_SCALE[self.generator])
+        n_elements = int(np.prod(self.representation.get_shape()))
+        return random_parameters and len(groupset['obs']) < AUTO_OBSERVATIONS_PER_ELEMENT * n_elements
+
     def build_variable(self) -> None:
-        self.variable = self.generator(self.name, **self.get_built_components(), shape=self.representation.get_shape(),
-                                       dims=self.dims())
+        if not self.noncentered:
+            self.variable = self.generator(self.name, **self.get_built_components(),
+                                           shape=self.representation.get_shape(), dims=self.dims())
+            return
+
+        location, scale = LOCATION_SCALE[self.generator]
+        parameters = self.get_built_components()
+        location_variable = parameters.pop(location, 0.)
+        scale_variable = parameters.pop(scale, 1.)
+        offset = self.generator(f'{self.name}_offset', **parameters, **{location: 0., scale: 1.},
+                                shape=self.representation.get_shape(), dims=self.dims())
+        self.variable = pm.Deterministic(self.name, location_variable + scale_variable * offset, dims=self.dims())
@@ -1,12 +1,21 @@
 import warnings
 from abc import ABC
-from typing import Callable, Any, Dict, Union, Tuple
+from typing import Callable, Any, Dict, List, Union, Tuple, Optional
 
 import numpy as np
+import numpy.typing as npt
+import pymc as pm
+import pytensor.tensor as pt
 
+from sakkara.model.base import ModelComponent
+from sakkara.model.fixed.base import UnrepeatableComponent
 from sakkara.model.fixed.data import DataComponent
-from sakkara.model.composable.group import GroupComponent
+from sakkara.model.function.base import FunctionComponent
 from sakkara.model.composable.hierarchical.distribution import DistributionComponent
+from sakkara.model.minibatch import MinibatchComponent
+from sakkara.model.utils import iterate_components
+from sakkara.relation.groupset import GroupSet
+from sakkara.relation.minibatch import MinibatchStrategy
 
 
 class Likelihood(DistributionComponent, ABC):
@@ -19,6 +28,11 @@ class Likelihood(DistributionComponent, ABC):
     :param group: Group of which the component is defined for.
     :param nan_param_mask: Masked distribution parameters to use for rows with `Nan`, must be defined for each keyword argument entered. Required if there are `Nan` in observed.
     :param nan_data_mask: Masked observed value to use for rows with `Nan`. Required if there are `Nan` in observed.
+
+    :ivar parameters: Components of the distribution parameters, without masking of rows with `Nan`.
+    :ivar observed_name: Name of the observed data, i.e., its column in the dataframe.
+    :ivar observed_data: Component of the observed data, with the rows with `Nan` masked.
+    :ivar observed_mask: Component of the mask of observed rows, `None` if there were no rows with `Nan`.
     """
 
     def __init__(self,
@@ -29,8 +43,10 @@ class Likelihood(DistributionComponent, ABC):
                  nan_param_mask: Dict[str, Any] = None,
                  nan_data_mask: Any = None,
                  **kwargs: Any):
-        if np.any(np.isnan(observed.values)):
-            if nan_param_mask is None or nan_data_mask:
+        nan_rows = np.isnan(observed.values)
+        observed_mask = None
+        if np.any(nan_rows):
+            if nan_param_mask is None or nan_data_mask is None:
                 raise ValueError(
                     'Both nan_param_mask and nan_data_mask must be defined when there is Nan in the observed data.')
 
@@ -38,6 +54,10 @@ class Likelihood(DistributionComponent, ABC):
                           UserWarning)
 
             components = {}
+            parameters = {}
+
+            # Mask of observed entries, shared by all the masked parameters
+            observed_mask = DataComponent(~nan_rows, group, name='mask_' + observed.name)
 
             for k, v in kwargs.items():
                 if k not in nan_param_mask:
@@ -45,26 +65,55 @@ class Likelihood(DistributionComponent, ABC):
 
                 var_mask = nan_param_mask[k] if isinstance(nan_param_mask, dict) else nan_param_mask
 
-                component = GroupComponent(group=group, name=k + '_masked')
-                mask_component = DataComponent(var_mask, 'global')
-                for m in np.argwhere(~np.isnan(observed.values)).flatten():
-                    component.add(m, v)
-                for m in np.argwhere(np.isnan(observed.values)).flatten():
-                    component.add(m, mask_component)
-                components[k] = component
+                # Select the parameter where observed, and the mask value elsewhere
+                parameters[k] = v if isinstance(v, ModelComponent) else UnrepeatableComponent(v)
+                components[k] = FunctionComponent(pt.switch, None, observed_mask, parameters[k],
+                                                  UnrepeatableComponent(var_mask))
 
-            non_nandata = np.array([o if not np.isnan(o) else nan_data_mask for o in observed.values])
+            non_nandata = np.where(nan_rows, nan_data_mask, observed.values)
             components['observed'] = DataComponent(non_nandata, group, name='masked_' + observed.name)
         else:
-            components = kwargs
+            parameters = {k: v if isinstance(v, ModelComponent) else UnrepeatableComponent(v) for k, v in
+                          kwargs.items()}
+            components = dict(parameters)
             components['observed'] = observed
 
         super().__init__(generator, name, group, **components)
+        self.parameters = parameters
+        self.observed_name = observed.name
+        self.observed_data = components['observed']
+        self.observed_mask = observed_mask
+        self.nan_data_mask = nan_data_mask
+
+    def bind_observed(self, values: npt.NDArray) -> List[DataComponent]:
+        """
+        Set new observed data, with the masked data and the mask recomputed from the rows with `Nan`.
+
+        :param values: The new observed data.
+
+        :return: The data components whose values are set.
+        """
+        nan_rows = np.isnan(values)
+        if self.observed_mask is None:
+            if np.any(nan_rows):
+                raise ValueError(f'Observed data {self.observed_name} contains Nan, but the likelihood was created '
+                                 f'without masks')
+            self.observed_data.values = values
+            return [self.observed_data]
+
+        self.observed_mask.values = ~nan_rows
+        self.observed_data.values = np.where(nan_rows, self.nan_data_mask, values)
+        return [self.observed_mask, self.observed_data]
 
 
 class MinibatchLikelihood(Likelihood):
     """
-        Likelihood to use if minibatch is used. Requires iid data.
+        Likelihood to use if minibatch is used. Requires iid data, unless a strategy respecting the groups of the data
+        is given.
+
+        With a weighted strategy, e.g., :class:`sakkara.relation.minibatch.StratifiedMinibatch`, the log-likelihood of
+        each sampled observation is scaled by its weight instead of by `total_size`, and the variable is registered as a
+        :class:`pymc.Potential` rather than an observed variable.
 
         :param generator: PyMC callable for distribution to use.
         :param observed: Data to input as observed keyword in PyMC.
@@ -73,6 +122,7 @@ class MinibatchLikelihood(Likelihood):
         :param group: Group of which the component is defined for.
         :param nan_param_mask: Masked distribution parameters to use for rows with `Nan`, must be defined for each keyword argument entered. Required if there are `Nan` in observed.
         :param nan_data_mask: Masked observed value to use for rows with `Nan`. Required if there are `Nan` in observed.
+        :param strategy: Strategy for sampling the mini-batch, defaults to uniform sampling.
         """
     def __init__(self, generator: Callable,
                  observed: DataComponent,
@@ -81,9 +131,43 @@ class MinibatchLikelihood(Likelihood):
                  group: str = 'obs',
                  nan_param_mask: Dict[str, Any] = None,
                  nan_data_mask: Any = None,
+                 strategy: Optional[MinibatchStrategy] = None,
                  **kwargs: Any):
-        kwargs['total_size'] = len(observed.values)
+        weighted = strategy is not None and strategy.weighted
+        if not weighted:
+            kwargs['total_size'] = len(observed.values)
         super().__init__(generator, observed, name, group, nan_param_mask, nan_data_mask, **kwargs)
+        self.total_size = self.parameters.pop('total_size') if not weighted else None
+
+        self.batch_size = batch_size
+        self.minibatch_group = group
+        self.strategy = strategy
+        self.minibatch_weights = None
 
         for k, v in self.subcomponents.items():
             self.subcomponents[k] = v.to_minibatch(batch_size, group)
+
+        # The mini-batch is created by whichever underlying component is built first
+        for component in iterate_components(self):
+            if isinstance(component, MinibatchComponent):
+                component.strategy = strategy
+
+    def bind_observed(self, values: npt.NDArray) -> List[DataComponent]:
+        # The log-likelihood is scaled by the number of observations, unless weighted by the strategy
+        if self.total_size is not None:
+            self.total_size.values = len(values)
+        return super().bind_observed(values)
+
+    def prebuild(self, groupset: GroupSet) -> None:
+        super().prebuild(groupset)
+        self.minibatch_weights = groupset[self.minibatch_group].minibatch_weights
+
+    def build_variable(self) -> None:
+        if self.minibatch_weights is None:
+            super().build_variable()
+        else:
+            # PyMC only accepts uniformly indexed mini-batches as observed, add the weighted log-likelihood instead
+            parameters = self.get_built_components()
+            observed = parameters.pop('observed')
+            logp = pm.logp(self.generator.dist(**parameters), observed)
+            self.variable = pm.Potential(self.name, pt.sum(self.minibatch_weights * logp))
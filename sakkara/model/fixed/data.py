@@ -1,33 +1,85 @@
+import mmap
+import os
 from abc import ABC
-from typing import Dict, Union, Tuple, Optional
+from typing import Any, Dict, Union, Tuple, Optional, Iterable, Sequence, Iterator
 
 import pandas as pd
 import numpy as np
 import numpy.typing as npt
 import pymc as pm
+import pytensor.tensor as pt
 
 from sakkara.model.base import ModelComponent
 from sakkara.model.fixed.base import FixedValueComponent
 from sakkara.model.minibatch import MinibatchComponent
-from sakkara.relation.groupset import GroupSet
+from sakkara.relation.groupset import GroupSet, init_chunks
 from sakkara.relation.representation import MinimalTensorRepresentation
 
 
+class FileBackedArray(np.memmap):
+    """
+    Read-only memory mapped array, which is pickled and copied by reference to its file rather than by its values.
+    Hence, processes receiving the array (e.g., the chains of :func:`pymc.sample`) map the same file, and share its
+    pages in memory instead of holding a copy each. Views of the array are pickled by value, as usual.
+    """
+
+    def is_mapping(self) -> bool:
+        # Only the array created from the file, not views of it, can be recreated from the file
+        return isinstance(self.base, mmap.mmap)
+
+    def __reduce__(self):
+        if not self.is_mapping():
+            return super().__reduce__()
+        order = 'F' if self.flags.f_contiguous and not self.flags.c_contiguous else 'C'
+        return FileBackedArray, (self.filename, self.dtype, 'r', self.offset, self.shape, order)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> npt.NDArray:
+        # The file is never written through the array, so the array is shared rather than copied
+        return self if self.is_mapping() else super().__deepcopy__(memo)
+
+
+def file_backed(data: np.memmap) -> FileBackedArray:
+    """
+    Map the file of a memory mapped array as a :class:`FileBackedArray`.
+
+    :param data: Memory mapped array, created from a file.
+
+    :return: Read-only array mapping the same part of the file.
+    """
+    if data.filename is None or not isinstance(data.base, mmap.mmap):
+        raise ValueError('Array must be memory mapped directly from a file')
+    if data.mode != 'r':
+        data.flush()
+    order = 'F' if data.flags.f_contiguous and not data.flags.c_contiguous else 'C'
+    return FileBackedArray(data.filename, dtype=data.dtype, mode='r', offset=data.offset, shape=data.shape,
+                           order=order)
+
+
 class DataComponent(FixedValueComponent, ABC):
     """
     Wrap data into a component
 
+    Data given as a :class:`numpy.memmap` created from a file is kept file-backed (see :class:`FileBackedArray`). Unless
+    mutable, it is registered in the model as a constant referring to the mapped file, without copying it into memory
+    nor converting its type. Hence, the data may be larger than memory, and is shared by processes sampling the model.
+
     :param data: Array of data to wrap.
     :param group: Group(s) of which the component is defined for. The number of elements should correspond to the
         order of the data array.
     :param name: Name of the component.
+    :param mutable: Register the data as :func:`pymc.MutableData` instead of :func:`pymc.ConstantData`, so that it can
+        be swapped after the model is built. See :class:`sakkara.model.ModelHandle`.
     """
 
-    def __init__(self, data: Union[npt.NDArray, float, int], group: Union[str, Tuple[str, ...]], name: str = None):
-        if isinstance(data, np.ndarray):
+    def __init__(self, data: Union[npt.NDArray, float, int], group: Union[str, Tuple[str, ...]], name: str = None,
+                 mutable: bool = False):
+        if isinstance(data, np.memmap) and not isinstance(data, FileBackedArray) and isinstance(data.base, mmap.mmap):
+            super().__init__(file_backed(data), group, name)
+        elif isinstance(data, np.ndarray):
             super().__init__(data, group, name)
         else:
             super().__init__(np.array([data]), group, name)
+        self.mutable = mutable
 
     def get_name(self) -> Optional[str]:
         return self.name
@@ -38,21 +90,107 @@ class DataComponent(FixedValueComponent, ABC):
             self.representation.add_group(groupset[g])
 
     def build_variable(self) -> None:
-        self.variable = pm.ConstantData(self.name, self.values)
+        if self.mutable:
+            self.variable = pm.MutableData(self.name, self.values)
+        elif isinstance(self.values, FileBackedArray):
+            # Unlike pm.ConstantData, the constant holds the mapped array itself rather than a converted copy
+            self.variable = pt.as_tensor_variable(self.values, name=pm.modelcontext(None).name_for(self.name))
+            pm.modelcontext(None).add_named_variable(self.variable)
+        else:
+            self.variable = pm.ConstantData(self.name, self.values)
 
     def to_minibatch(self, batch_size: int, group: str) -> 'ModelComponent':
         return MinibatchComponent(self, batch_size, group)
 
 
-def data_components(df: pd.DataFrame, group: Union[str, Tuple[str, ...]] = 'obs') -> Dict[str, DataComponent]:
+def data_components(df: pd.DataFrame, group: Union[str, Tuple[str, ...]] = 'obs',
+                    mutable: bool = False) -> Dict[str, DataComponent]:
     """
     Generate :class:`DataComponent` objects from a :class:`pandas.DataFrame`
 
     :param df: DataFrame to generate components from.
     :param group: Group to apply, i.e., each member of the given group corresponds to one row of the dataframe.
+    :param mutable: Whether the data of the components can be swapped after the model is built.
 
 
     :return: Dictionary of {<column name in DataFrame>: :class:`DataComponent`}
 
     """
-    return {k: DataComponent(df[k].values, group, k) for k in df}
+    return {k: DataComponent(df[k].values, group, k, mutable) for k in df}
+
+
+def ingest_chunks(chunks: Iterable[pd.DataFrame], group_columns: Sequence[str], data_columns: Sequence[str],
+                  directory: str, mutable: bool = False) -> Tuple[GroupSet, Dict[str, DataComponent]]:
+    """
+    Read a dataframe given as consecutive chunks of rows, e.g., partitions of a file larger than memory, in a single
+    pass. The groups are derived incrementally (see :func:`sakkara.relation.groupset.init_chunks`), and the data
+    columns are written to files in a directory and backed by memory mapped arrays.
+
+    **Example**
+
+    .. highlight:: python
+    .. code-block:: python
+
+        chunks = pd.read_csv('large.csv', chunksize=10 ** 6)
+        groupset, dc = ingest_chunks(chunks, ['g'], ['x', 'y'], 'data')
+        likelihood = MinibatchLikelihood(pm.Normal, observed=dc['y'], batch_size=100, mu=k * dc['x'], sigma=1)
+        model = build(groupset, likelihood)
+
+    :param chunks: Iterable of dataframes, each containing the group and data columns.
+    :param group_columns: Columns defining groups.
+    :param data_columns: Numeric columns to create :class:`DataComponent` objects of, on the `obs` group.
+    :param directory: Directory to write the data columns to, as raw arrays in `<column name>.bin` files.
+    :param mutable: Whether the data of the components can be swapped after the model is built.
+
+    :return: GroupSet of the group columns (including the `global` and `obs` groups), and dictionary of
+        {<data column name>: :class:`DataComponent`}
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    dtypes = {}
+
+    def write(chunk_iterator: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for chunk in chunk_iterator:
+            for column in data_columns:
+                values = chunk[column].to_numpy()
+                if column not in files:
+                    if values.dtype == object:
+                        raise ValueError(f'Data column {column} must be numeric')
+                    dtypes[column] = values.dtype
+                    files[column] = open(os.path.join(directory, f'{column}.bin'), 'wb')
+                elif not np.can_cast(values.dtype, dtypes[column], 'safe'):
+                    # E.g., an integer column read as float in a later chunk with missing values
+                    if values.dtype == object:
+                        raise ValueError(f'Data column {column} must be numeric')
+                    files[column].close()
+                    promoted = np.result_type(dtypes[column], values.dtype)
+                    promote_file(os.path.join(directory, f'{column}.bin'), dtypes[column], promoted)
+                    dtypes[column] = promoted
+                    files[column] = open(os.path.join(directory, f'{column}.bin'), 'ab')
+                files[column].write(np.ascontiguousarray(values, dtype=dtypes[column]).tobytes())
+            yield chunk
+
+    try:
+        groupset = init_chunks(write(chunks), group_columns, builtin_groups=True)
+    finally:
+        for f in files.values():
+            f.close()
+
+    n_rows = len(groupset['obs'])
+    return groupset, {c: DataComponent(np.memmap(os.path.join(directory, f'{c}.bin'), dtype=dtypes[c], mode='r',
+                                                 shape=(n_rows,)), 'obs', c, mutable) for c in data_columns}
+
+
+def promote_file(path: str, dtype: np.dtype, promoted: np.dtype) -> None:
+    """
+    Convert a file of a raw array to a type that holds all values of the original type.
+
+    :param path: Path of the file.
+    :param dtype: Type of the array in the file.
+    :param promoted: Type to convert the array to.
+    """
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as f:
+        if os.path.getsize(path) > 0:
+            f.write(np.memmap(path, dtype=dtype, mode='r').astype(promoted).tobytes())
+    os.replace(temporary_path, path)
@@ -1,9 +1,12 @@
 import operator
 from abc import ABC
 from itertools import chain
-from typing import Callable, Any, Set, Optional, Tuple
+from typing import Callable, Any, Set, Optional, Tuple, List, Hashable
 
 from sakkara.model.base import ModelComponent
+from sakkara.model.function.elementwise import Elementwise, Expression, OPERATOR_NAMES, evaluate_pushed_down, fold, \
+    is_pushable, substitute
+from sakkara.model.utils import name_components
 from sakkara.relation.groupset import GroupSet
 from sakkara.relation.representation import MinimalTensorRepresentation
 
@@ -51,29 +54,37 @@ class FunctionComponent(ModelComponent, ABC):
             if comp.get_name() is None:
                 comp.set_name(name + '_' + str(self.fct) + '_' + k)
 
+    def get_subcomponents(self) -> List[ModelComponent]:
+        return list(chain(self.args, self.kwargs.values()))
+
     def clear(self):
         self.variable = None
         self.representation = None
         for comp in chain(self.args, self.kwargs.values()):
             comp.clear()
 
+    def get_structure(self, canonical: Callable[[ModelComponent], ModelComponent]) -> Optional[Hashable]:
+        if not isinstance(self.fct, Hashable):
+            return None
+        return (FunctionComponent, self.fct, self.output_group, tuple(id(canonical(c)) for c in self.args),
+                tuple((k, id(canonical(c))) for k, c in sorted(self.kwargs.items())))
+
+    def share_build(self, other: 'FunctionComponent') -> None:
+        super().share_build(other)
+        self.input_representation = other.input_representation
+
+    def validate(self) -> None:
+        if any(c.get_name() is None for c in self.get_subcomponents()):
+            raise ValueError('All arguments to must be named')
+
     def prebuild(self, groupset: GroupSet) -> None:
-        unbuilt = [c for c in chain(self.args, self.kwargs.values())]
-
-        all_args = len(self.args) + len(self.kwargs)
-        counter = 0
-        while 0 < len(unbuilt):
-            component = unbuilt.pop(0)
-            if component.get_name() is None:
-                # Other components may be needed to be built first
-                if counter < all_args * (1 + all_args) / 2:
-                    unbuilt.append(component)
-                else:
-                    # Did not help to build other component first, name must be defined for this explicitly
-                    raise ValueError('All arguments to must be named')
-            elif component.variable is None:
+        # Arguments may be named by other components underlying this one
+        name_components(self)
+        self.validate()
+
+        for component in self.get_subcomponents():
+            if component.variable is None:
                 component.build(groupset)
-            counter += 1
 
     def build_representation(self, groupset: GroupSet) -> None:
         self.input_representation = MinimalTensorRepresentation()
@@ -85,7 +96,40 @@ class FunctionComponent(ModelComponent, ABC):
         else:
             self.representation = MinimalTensorRepresentation(*tuple(map(lambda g: groupset[g], self.output_group)))
 
+    def is_elementwise(self) -> bool:
+        """
+        Check if this component is an elementwise function of its arguments, see
+        :class:`sakkara.model.function.elementwise.Elementwise`.
+        """
+        return isinstance(self.fct, Elementwise) and len(self.kwargs) == 0 and self.output_group is None
+
+    def get_inlined_expression(self) -> Tuple[Expression, List[ModelComponent]]:
+        """
+        Get the expression of this elementwise component, with the expressions of elementwise arguments inlined.
+
+        :return: The inlined expression, and the (non-elementwise) components that are the inputs of the expression.
+        """
+        inputs = []
+
+        def inline(component: ModelComponent) -> Expression:
+            if isinstance(component, FunctionComponent) and component.is_elementwise():
+                return substitute(component.fct.expression, tuple(map(inline, component.args)))
+
+            if not any(component is c for c in inputs):
+                inputs.append(component)
+            return 'input', next(i for i, c in enumerate(inputs) if c is component)
+
+        return inline(self), inputs
+
     def build_variable(self) -> None:
+        if self.is_elementwise():
+            expression, inputs = self.get_inlined_expression()
+            if is_pushable(expression):
+                # Evaluate parts of the expression at coarser levels, before mapping them to the input representation
+                self.variable = evaluate_pushed_down(expression, [(c.variable, c.representation) for c in inputs],
+                                                     self.input_representation)
+                return
+
         mapped_args = tuple([c.representation.map(c.variable, self.input_representation) for c in self.args])
         mapped_kwargs = dict(
             {k: c.representation.map(c.variable, self.input_representation) for k, c in self.kwargs.items()})
@@ -104,12 +148,38 @@ class FunctionComponent(ModelComponent, ABC):
                                  **{k: v.to_minibatch(batch_size, group) for k, v in self.kwargs.items()})
 
     @staticmethod
-    def math_op(fct: Callable, left: Any, right: Any) -> ModelComponent:
-        if isinstance(left, ModelComponent) and isinstance(right, ModelComponent):
-            return FunctionComponent(fct, None, left, right)
-        if isinstance(left, ModelComponent):
-            return FunctionComponent(lambda x: fct(x, right), None, left)
-        return FunctionComponent(lambda x: fct(left, x), None, right)
+    def math_op(fct: Callable, *operands: Any) -> ModelComponent:
+        """
+        Create a component of an elementwise operator applied to operands. Operands that are not components are
+        treated as constants, which are folded into the expression where possible. A chain of operators between a
+        component and constants is fused into a single elementwise function.
+
+        :param fct: Operator in :data:`sakkara.model.function.elementwise.OPERATORS`.
+        :param operands: Operands of the operator.
+
+        :return: Component of the result.
+        """
+        fuse = sum(isinstance(o, ModelComponent) for o in operands) == 1
+        args = []
+        expressions = []
+        for operand in operands:
+            if not isinstance(operand, ModelComponent):
+                expressions.append(('constant', operand))
+                continue
+
+            if fuse and isinstance(operand, FunctionComponent) and operand.is_elementwise():
+                expression, operand_args = operand.fct.expression, operand.args
+            else:
+                expression, operand_args = ('input', 0), (operand,)
+
+            indices = []
+            for arg in operand_args:
+                if not any(arg is a for a in args):
+                    args.append(arg)
+                indices.append(next(i for i, a in enumerate(args) if a is arg))
+            expressions.append(substitute(expression, tuple(('input', i) for i in indices)))
+
+        return FunctionComponent(Elementwise(fold(OPERATOR_NAMES[fct], *expressions)), None, *args)
 
     def __add__(self, other: Any) -> ModelComponent:
         return FunctionComponent.math_op(operator.add, self, other)
@@ -154,4 +224,4 @@ class FunctionComponent(ModelComponent, ABC):
         return FunctionComponent.math_op(operator.truediv, other, self)
 
     def __neg__(self):
-        return FunctionComponent(operator.neg, None, self)
+        return FunctionComponent.math_op(operator.neg, self)
@@ -0,0 +1,266 @@
+import numbers
+import operator
+from itertools import chain, combinations
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sakkara.relation.representation import MinimalTensorRepresentation, Representation
+
+OPERATORS: Dict[str, Callable] = {
+    'add': operator.add,
+    'sub': operator.sub,
+    'mul': operator.mul,
+    'truediv': operator.truediv,
+    'floordiv': operator.floordiv,
+    'mod': operator.mod,
+    'pow': operator.pow,
+    'neg': operator.neg,
+}
+
+OPERATOR_NAMES: Dict[Callable, str] = {fct: name for name, fct in OPERATORS.items()}
+
+# Value that leaves the other operand unchanged, for operators where the order of operands does not matter
+IDENTITIES = {'add': 0, 'mul': 1}
+
+Expression = Tuple[Any, ...]
+
+
+class Elementwise:
+    """
+    Elementwise function given by an expression tree of known operators, constants and inputs. Unlike a closure, the
+    function can be compared, hashed, pickled and simplified.
+
+    An expression is a tuple, either `('input', i)` for the i:th argument of the function, `('constant', value)` for a
+    constant, or `(<operator name>, *operands)` for an operator of :data:`OPERATORS` applied to operand expressions.
+
+    :param expression: The expression tree.
+    """
+
+    def __init__(self, expression: Expression):
+        self.expression = expression
+
+    def __call__(self, *args: Any) -> Any:
+        return evaluate(self.expression, args)
+
+    def get_key(self) -> Hashable:
+        """
+        Get a hashable key of the expression, equal for equal expressions.
+        """
+        return expression_key(self.expression)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Elementwise) and self.get_key() == other.get_key()
+
+    def __hash__(self) -> int:
+        return hash(self.get_key())
+
+    def __str__(self) -> str:
+        return f'<{expression_str(self.expression)}>'
+
+    def __repr__(self) -> str:
+        return f'Elementwise({expression_str(self.expression)})'
+
+
+def evaluate(expression: Expression, args: Tuple[Any, ...]) -> Any:
+    """
+    Evaluate an expression.
+
+    :param expression: The expression tree.
+    :param args: Values of the inputs of the expression.
+
+    :return: The value of the expression.
+    """
+    kind, *operands = expression
+    if kind == 'input':
+        return args[operands[0]]
+    if kind == 'constant':
+        return operands[0]
+    return apply_operator(kind, *(evaluate(o, args) for o in operands))
+
+
+def apply_operator(kind: str, *values: Any) -> Any:
+    """
+    Apply an operator to values, skipping additions of zero and multiplications by one that leave the type of the
+    other value unchanged.
+
+    :param kind: Name of the operator.
+    :param values: Values of the operands.
+
+    :return: The value of the operator.
+    """
+    if kind in IDENTITIES and len(values) == 2:
+        for value, other in (values, values[::-1]):
+            if is_identity(kind, value, other):
+                return other
+    return OPERATORS[kind](*values)
+
+
+def is_identity(kind: str, value: Any, other: Any) -> bool:
+    """
+    Check if a value is the identity of an operator that leaves the other operand unchanged, including its type, i.e.,
+    if `np.result_type` of the operands is the type of the other operand.
+    """
+    if not isinstance(value, numbers.Number) or value != IDENTITIES[kind] or not hasattr(other, 'dtype'):
+        return False
+    return np.result_type(np.dtype(other.dtype), value) == np.dtype(other.dtype)
+
+
+def is_constant(expression: Expression) -> bool:
+    return expression[0] == 'constant' and isinstance(expression[1], (numbers.Number, np.ndarray))
+
+
+def fold(kind: str, *operands: Expression) -> Expression:
+    """
+    Create the expression of an operator applied to operands, simplified by folding constants.
+
+    :param kind: Name of the operator.
+    :param operands: Expressions of the operands, which are assumed to be already folded.
+
+    :return: The simplified expression.
+    """
+    if all(map(is_constant, operands)):
+        return 'constant', OPERATORS[kind](*(o[1] for o in operands))
+
+    if kind in IDENTITIES and len(operands) == 2:
+        left, right = operands
+        # Bring a constant operand to the right
+        if is_constant(left):
+            left, right = right, left
+
+        if is_constant(right):
+            # The identity is kept, as it may change the type of the other operand, e.g., x * 1.0 for integer x, see
+            # apply_operator
+            if left[0] == kind and is_constant(left[2]):
+                # Combine constants of consecutive operators, e.g., (x * 2) * 3 into x * 6
+                return fold(kind, left[1], ('constant', OPERATORS[kind](left[2][1], right[1])))
+        return kind, left, right
+
+    return (kind, *operands)
+
+
+def substitute(expression: Expression, operands: Tuple[Expression, ...]) -> Expression:
+    """
+    Replace the inputs of an expression by other expressions.
+
+    :param expression: The expression tree.
+    :param operands: Expression to replace each input with.
+
+    :return: The expression with replaced inputs.
+    """
+    kind, *children = expression
+    if kind == 'input':
+        return operands[children[0]]
+    if kind == 'constant':
+        return expression
+    return (kind, *(substitute(c, operands) for c in children))
+
+
+def is_pushable(expression: Expression) -> bool:
+    """
+    Check if an expression can be evaluated with :func:`evaluate_pushed_down`, i.e., if all constants are scalars
+    that broadcast to any representation.
+    """
+    kind, *operands = expression
+    if kind == 'input':
+        return True
+    if kind == 'constant':
+        return isinstance(operands[0], numbers.Number)
+    return all(map(is_pushable, operands))
+
+
+def evaluate_pushed_down(expression: Expression, inputs: Sequence[Tuple[Any, Representation]],
+                         target: Representation) -> Any:
+    """
+    Evaluate an expression where each operator is applied at the smallest representation of its operands, and
+    variables are mapped to finer representations as late as possible. Operands of consecutive additions or
+    multiplications are combined in the order that keeps the intermediate results smallest, e.g., in
+    `x_obs * a_group * b_group` the group level variables are multiplied before being mapped to the observations.
+
+    :param expression: The expression tree, see :func:`is_pushable`.
+    :param inputs: Variable and representation of each input of the expression.
+    :param target: Representation of the result.
+
+    :return: The value of the expression, with target representation.
+    """
+    evaluated = {}
+
+    def lower(e: Expression) -> Tuple[Any, Optional[Representation]]:
+        key = expression_key(e)
+        if key not in evaluated:
+            evaluated[key] = lower_uncached(e)
+        return evaluated[key]
+
+    def lower_uncached(e: Expression) -> Tuple[Any, Optional[Representation]]:
+        kind, *operands = e
+        if kind == 'input':
+            return inputs[operands[0]]
+        if kind == 'constant':
+            return operands[0], None
+        if kind not in IDENTITIES:
+            return apply(kind, *map(lower, operands))
+
+        terms = list(map(lower, flatten(kind, e)))
+        while len(terms) > 1:
+            i, j = min(combinations(range(len(terms)), 2),
+                       key=lambda p: int(np.prod(union(terms[p[0]][1], terms[p[1]][1]).get_shape())))
+            combined = apply(kind, terms[i], terms[j])
+            terms = [t for k, t in enumerate(terms) if k not in (i, j)] + [combined]
+        return terms[0]
+
+    variable, representation = lower(expression)
+    return representation.map(variable, target)
+
+
+def flatten(kind: str, expression: Expression) -> List[Expression]:
+    """
+    Get the operands of consecutive applications of an operator, e.g., `[x, y, z]` for `(x + y) + z`.
+    """
+    if expression[0] != kind:
+        return [expression]
+    return [f for operand in expression[1:] for f in flatten(kind, operand)]
+
+
+def union(*representations: Optional[Representation]) -> Optional[Representation]:
+    """
+    Get the smallest representation that all representations can be mapped to, `None` standing for scalars.
+    """
+    representations = [r for r in representations if r is not None]
+    if len(representations) == 0:
+        return None
+
+    combined = MinimalTensorRepresentation(*chain.from_iterable(r.get_groups() for r in representations))
+    return next((r for r in representations if r == combined), combined)
+
+
+def apply(kind: str, *terms: Tuple[Any, Optional[Representation]]) -> Tuple[Any, Optional[Representation]]:
+    representation = union(*(r for _, r in terms))
+    mapped = (v if r is None else r.map(v, representation) for v, r in terms)
+    return apply_operator(kind, *mapped), representation
+
+
+def constant_key(value: Any) -> Hashable:
+    if isinstance(value, np.ndarray):
+        return 'array', value.dtype.str, value.shape, value.tobytes()
+    if isinstance(value, Hashable):
+        return value
+    return 'object', id(value)
+
+
+def expression_key(expression: Expression) -> Hashable:
+    kind, *operands = expression
+    if kind == 'input':
+        return expression
+    if kind == 'constant':
+        return kind, type(operands[0]).__name__, constant_key(operands[0])
+    return (kind, *(expression_key(o) for o in operands))
+
+
+def expression_str(expression: Expression) -> str:
+    kind, *operands = expression
+    if kind == 'input':
+        return f'x{operands[0]}'
+    if kind == 'constant':
+        value = operands[0]
+        return str(value) if np.ndim(value) == 0 else f'{type(value).__name__}{np.shape(value)}'
+    return f'{kind}({", ".join(map(expression_str, operands))})'
@@ -0,0 +1,251 @@
+from typing import List, Optional, Sequence
+
+import arviz as az
+import numpy as np
+import pandas as pd
+import pymc as pm
+import pytensor
+import pytensor.tensor as pt
+import xarray as xr
+
+from sakkara.model.base import ModelComponent
+from sakkara.model.composable.hierarchical.distribution import DistributionComponent
+from sakkara.model.composable.hierarchical.likelihood import Likelihood
+from sakkara.model.fixed.data import DataComponent
+from sakkara.model.utils import clone, iterate_components, init_groupset, build_graph
+from sakkara.relation.group import Group
+from sakkara.relation.groupset import GroupSet, get_coords
+from sakkara.relation.representation import MinimalTensorRepresentation
+
+
+class ModelHandle:
+    """
+    Handle of a built model, whose data can be swapped for new data with the same groups without rebuilding the
+    model. The model is built from a copy of the component (see :func:`sakkara.model.utils.clone`), whose
+    :class:`DataComponent` objects are registered as :func:`pymc.MutableData`, hence functions compiled from the model
+    remain valid after the data is swapped. The component itself is left unchanged and unbuilt.
+
+    **Example**
+
+    .. highlight:: python
+    .. code-block:: python
+
+        handle = ModelHandle(df, likelihood)
+        with handle:
+            idata = pm.sample()
+
+        # Same groups, new values of the data columns
+        handle.set_data(new_df)
+        with handle:
+            new_idata = pm.sample()
+
+    :param df: :class:`pandas.DataFrame` containing columns defining groups used among :class:`ModelComponent` objects.
+    :param component: :class:`ModelComponent` object to build the model from, see :func:`sakkara.model.build`.
+
+    :ivar component: The built copy of the component.
+    """
+
+    def __init__(self, df: pd.DataFrame, component: ModelComponent):
+        self.component = clone(component)
+        self.data_components: List[DataComponent] = [c for c in iterate_components(self.component) if
+                                                     isinstance(c, DataComponent)]
+        for data_component in self.data_components:
+            data_component.mutable = True
+
+        self.groupset = init_groupset(df, self.component)
+        self.n_rows = len(df)
+        # Groups given by columns, the rows of each are compared to the codes of the group set when swapping data
+        self.group_names = [g for g in self.groupset.groups if g not in ('global', 'obs')]
+
+        with pm.Model(coords=self.groupset.coords()) as self.model:
+            build_graph(self.component, self.groupset)
+
+    def validate(self, df: pd.DataFrame) -> None:
+        """
+        Check that a dataframe has the same group members, on the same rows, as the dataframe the model was built with.
+
+        :param df: :class:`pandas.DataFrame` to validate.
+        """
+        if len(df) != self.n_rows:
+            raise ValueError(f'Expected {self.n_rows} rows, as the data the model was built with, got {len(df)}')
+
+        obs = self.groupset['obs']
+        for group_name in self.group_names:
+            if group_name not in df.columns:
+                raise ValueError(f'Group column {group_name} is missing')
+
+            new_codes, new_members = pd.factorize(df[group_name], use_na_sentinel=False)
+            if not pd.Index(new_members).equals(pd.Index(self.groupset[group_name].members)):
+                raise ValueError(f'Members of group {group_name} differ from the data the model was built with')
+            if not np.array_equal(new_codes, obs.get_mapping(group_name)):
+                raise ValueError(f'Rows of group {group_name} differ from the data the model was built with')
+
+    def set_data(self, df: pd.DataFrame) -> None:
+        """
+        Swap the data of the model. Each :class:`DataComponent` defined on the `obs` group, whose name is a column of
+        the dataframe, gets the values of that column. The observed data of each :class:`Likelihood` is set from the
+        column of its observed data, with the masked data and mask of rows with `Nan` recomputed (see
+        :meth:`Likelihood.bind_observed`). Rows that were observed when the model was built must not be `Nan`.
+
+        :param df: :class:`pandas.DataFrame` with the same groups as the dataframe the model was built with, see
+            :meth:`ModelHandle.validate`.
+        """
+        self.validate(df)
+
+        new_data = {}
+        for likelihood in iterate_components(self.component):
+            if isinstance(likelihood, Likelihood) and likelihood.observed_name in df.columns:
+                values = df[likelihood.observed_name].values
+                observed_rows = np.ones(len(values), dtype=bool) if likelihood.observed_mask is None else \
+                    likelihood.observed_mask.values
+                if np.any(np.isnan(values) & observed_rows):
+                    raise ValueError(f'Observed data {likelihood.observed_name} is Nan on rows that were observed '
+                                     f'when the model was built')
+                for data_component in likelihood.bind_observed(values):
+                    new_data[data_component.name] = data_component.values
+
+        for data_component in self.data_components:
+            if data_component.group == ('obs',) and data_component.name in df.columns:
+                data_component.values = df[data_component.name].values
+                new_data[data_component.name] = data_component.values
+
+        pm.set_data(new_data, model=self.model)
+
+    def prediction_groupset(self, df: pd.DataFrame) -> GroupSet:
+        """
+        Create a group set where the `obs` group (and its twins) is replaced by the rows of a new dataframe, whose
+        other group columns must only contain members of the dataframe the model was built with. Until the group set
+        is released by :meth:`ModelHandle.release_groupset`, it is registered as child of the original groups.
+
+        :param df: :class:`pandas.DataFrame` with the new rows.
+
+        :return: The group set with the new observation group.
+        """
+        obs = self.groupset['obs']
+        prediction_obs = Group('obs', pd.RangeIndex(len(df)))
+
+        groups = {}
+        for group_name, group in self.groupset.groups.items():
+            if group in obs.twins:
+                groups[group_name] = prediction_obs
+                continue
+
+            groups[group_name] = group
+            if group_name == 'global':
+                codes = np.zeros(len(df), dtype=int)
+            elif group.combination is not None:
+                missing = [c for c in group.combination if c not in df.columns]
+                if len(missing) > 0:
+                    raise ValueError(f'Group columns {missing} are missing')
+                # Map the rows to the existing member combinations
+                codes = pd.MultiIndex.from_tuples(group.members).get_indexer(
+                    pd.MultiIndex.from_arrays([df[c] for c in group.combination]))
+                if np.any(codes < 0):
+                    raise ValueError(f'Combinations of {group_name} not found in the data the model was built with')
+            elif group_name not in df.columns:
+                raise ValueError(f'Group column {group_name} is missing')
+            else:
+                # Map the rows to the member indices of the existing group
+                codes = pd.Index(group.members).get_indexer(df[group_name])
+                if np.any(codes < 0):
+                    raise ValueError(f'Members of group {group_name} not found in the data the model was built with')
+
+            prediction_obs.add_parent(group, codes)
+            group.add_child(prediction_obs)
+
+        return GroupSet(groups)
+
+    def release_groupset(self, groupset: GroupSet) -> None:
+        """
+        Detach a group set from :meth:`ModelHandle.prediction_groupset` from the groups of the model.
+        """
+        prediction_obs = groupset['obs']
+        for group in prediction_obs.parents:
+            group.children.discard(prediction_obs)
+        for group in self.groupset.groups.values():
+            group.mapping_cache = self.groupset.mapping_cache
+
+    def predict(self, idata: az.InferenceData, df: pd.DataFrame, var_names: Optional[Sequence[str]] = None
+                ) -> xr.Dataset:
+        """
+        Evaluate the distribution parameters of the likelihood on new rows, for each posterior draw. Rows are mapped
+        onto the existing members of each group, the components that are not defined per observation are reused as
+        built. Hence, components defined per observation must not be random, and each :class:`DataComponent` defined
+        per observation must have a column in the dataframe.
+
+        :param idata: Inference data with posterior draws of the free variables of the model.
+        :param df: :class:`pandas.DataFrame` with the rows to predict.
+        :param var_names: Names of the distribution parameters to evaluate, defaults to all.
+
+        :return: Dataset with a variable of shape (chain, draw, ...) per distribution parameter.
+        """
+        if not isinstance(self.component, Likelihood):
+            raise ValueError('Prediction requires the model to be built from a Likelihood')
+
+        parameters = {k: v for k, v in self.component.parameters.items() if var_names is None or k in var_names}
+
+        obs = self.groupset['obs']
+        # All components defined per observation need to be rebuilt on the new rows
+        obs_components = {}
+        for parameter in parameters.values():
+            for component in iterate_components(parameter):
+                if component.representation is not None and any(
+                        g in obs.twins for g in component.representation.get_groups()):
+                    obs_components[id(component)] = component
+
+        saved_states = [(c, dict(vars(c))) for c in obs_components.values()]
+        groupset = self.prediction_groupset(df)
+        try:
+            for component in obs_components.values():
+                if isinstance(component, DistributionComponent):
+                    raise ValueError(f'Can not predict {component.get_name()}, random variable per observation')
+                if isinstance(component, DataComponent):
+                    if component.name not in df.columns:
+                        raise ValueError(f'Data column {component.name} is missing')
+                    component.values = df[component.name].values
+                component.variable = None
+
+            representation = MinimalTensorRepresentation(*map(lambda g: groupset[g], self.component.group))
+            # Variables are registered in a separate model, to not interfere with the built model
+            with pm.Model(coords=groupset.coords()):
+                for parameter in parameters.values():
+                    if parameter.variable is None:
+                        build_graph(parameter, groupset)
+                predicted = {k: pt.as_tensor_variable(self.component.map_component(v, representation)) for k, v in
+                             parameters.items()}
+        finally:
+            self.release_groupset(groupset)
+            for component, state in saved_states:
+                component.__dict__.update(state)
+
+        # Compile a single function from the free variables, stacked over draws, to the parameters of each draw
+        free_rvs = self.model.free_RVs
+        inputs = [pt.tensor(dtype=rv.dtype, shape=(None,) + rv.type.shape) for rv in free_rvs]
+        outputs, _ = pytensor.scan(
+            lambda *point: pytensor.clone_replace(list(predicted.values()), replace=dict(zip(free_rvs, point))),
+            sequences=inputs)
+        outputs = outputs if isinstance(outputs, list) else [outputs]
+        fct = pytensor.function(inputs, outputs, on_unused_input='ignore')
+
+        n_chains, n_draws = idata.posterior.sizes['chain'], idata.posterior.sizes['draw']
+        # Flatten chains and draws, and evaluate all draws in a single call
+        draws = [idata.posterior[rv.name].values.reshape((n_chains * n_draws,) + rv.type.shape) for rv in free_rvs]
+        evaluated = fct(*draws)
+
+        data = {}
+        for k, values in zip(predicted.keys(), evaluated):
+            data[k] = values.reshape((n_chains, n_draws) + values.shape[1:])
+
+        # Rows of the new dataframe for the observation group, and the existing members for other groups
+        coords = {str(g): df.index.values if g is groupset['obs'] else get_coords(g) for g in
+                  representation.get_groups()}
+        dims = list(coords)
+        shape = representation.get_shape()
+        return az.convert_to_dataset(data, coords=coords,
+                                     dims={k: dims for k, v in data.items() if v.shape[2:] == shape})
+
+    def __enter__(self) -> pm.Model:
+        return self.model.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.model.__exit__(*exc_info)
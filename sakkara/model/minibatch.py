@@ -1,8 +1,10 @@
 from abc import ABC
+from typing import Optional, Callable, Hashable
 
 from sakkara.model.base import ModelComponent
 from sakkara.model.wrapper import WrapperComponent
 from sakkara.relation.groupset import GroupSet
+from sakkara.relation.minibatch import MinibatchStrategy
 from sakkara.relation.representation import MinimalTensorRepresentation
 
 
@@ -13,21 +15,26 @@ class MinibatchComponent(WrapperComponent, ABC):
     :param component: Component to be wrapped.
     :param batch_size: Batch size of the mini-batch.
     :param group: Group to apply mini-batching on.
+    :param strategy: Strategy for sampling the mini-batch, defaults to uniform sampling.
     """
-    def __init__(self, component: ModelComponent, batch_size: int, group: str):
+    def __init__(self, component: ModelComponent, batch_size: int, group: str,
+                 strategy: Optional[MinibatchStrategy] = None):
         super().__init__(component)
         self.batch_size = batch_size
         self.group = group
-        self.transformed_variable = None
+        self.strategy = strategy
 
     def build_representation(self, groupset: GroupSet) -> None:
         self.representation = MinimalTensorRepresentation(groupset[self.group])
 
-        self.transformed_variable = self.component.representation.map(self.component.variable, self.representation)
-
     def to_minibatch(self, batch_size: int, group: str) -> 'ModelComponent':
         return self.component.to_minibatch(batch_size, group)
 
+    def get_structure(self, canonical: Callable[[ModelComponent], ModelComponent]) -> Optional[Hashable]:
+        return MinibatchComponent, id(canonical(self.component)), self.batch_size, self.group, id(self.strategy)
+
     def build_variable(self) -> None:
-        minibatch = self.representation.get_groups()[0].get_minibatch(self.batch_size)
-        self.variable = self.transformed_variable[minibatch]
+        minibatch = self.representation.get_groups()[0].get_minibatch(self.batch_size, self.strategy)
+        # Only the members in the mini-batch are mapped from the component, independently of the size of the group
+        self.variable = self.component.representation.map_subset(self.component.variable, self.representation,
+                                                                 minibatch)
@@ -0,0 +1,154 @@
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Mapping, Optional, Tuple, Union
+
+import arviz as az
+import cloudpickle
+import pandas as pd
+import pymc as pm
+
+from sakkara.model.base import ModelComponent
+from sakkara.model.composable.hierarchical.likelihood import Likelihood
+from sakkara.model.fixed.data import DataComponent
+from sakkara.model.utils import build, clone, iterate_components
+
+DataFrames = Union[Mapping[Hashable, pd.DataFrame], Iterable[Tuple[Hashable, pd.DataFrame]]]
+
+
+def bind_data(component: ModelComponent, df: pd.DataFrame) -> ModelComponent:
+    """
+    Clone a component for a dataframe. Each :class:`DataComponent` defined on the `obs` group, whose name is a column
+    of the dataframe, gets the values of that column. The observed data of each :class:`Likelihood` is set from the
+    column of its observed data, see :meth:`Likelihood.bind_observed`, which must be present in the dataframe.
+
+    :param component: The component to clone, see :func:`sakkara.model.utils.clone`.
+    :param df: :class:`pandas.DataFrame` to take the data from.
+
+    :return: The clone with the data of the dataframe.
+    """
+    component = clone(component)
+    bound = set()
+    for c in iterate_components(component):
+        if isinstance(c, Likelihood):
+            if c.observed_name not in df.columns:
+                raise ValueError(f'Observed column {c.observed_name} is missing')
+            bound.update(map(id, c.bind_observed(df[c.observed_name].values)))
+
+    for c in iterate_components(component):
+        if isinstance(c, DataComponent) and c.group == ('obs',) and c.name in df.columns and id(c) not in bound:
+            c.values = df[c.name].values
+    return component
+
+
+def build_one(df: pd.DataFrame, component: ModelComponent) -> pm.Model:
+    return build(df, bind_data(component, df))
+
+
+def build_pickled(df: pd.DataFrame, component: ModelComponent) -> bytes:
+    # Models are not picklable by the standard pickle module used to return results from the process pool
+    return cloudpickle.dumps(build_one(df, component))
+
+
+def sample(model: pm.Model) -> az.InferenceData:
+    """
+    Default fit of :func:`fit_many`, NUTS sampling in a single process without progress bar.
+    """
+    return pm.sample(model=model, cores=1, progressbar=False)
+
+
+def fit_one(df: pd.DataFrame, component: ModelComponent, fit: Callable[[pm.Model], Any]) -> Any:
+    return fit(build_one(df, component))
+
+
+def map_many(function: Callable[..., Any], dfs: DataFrames, *args: Any, n_jobs: Optional[int] = None,
+             max_pending: Optional[int] = None) -> Iterator[Tuple[Hashable, Any]]:
+    """
+    Apply a function to many dataframes in a process pool, yielding the results as they are completed. At most
+    `max_pending` dataframes are submitted at a time, and dataframes are only taken from `dfs` when submitted. Hence,
+    memory is bounded when `dfs` is a generator that loads each dataframe and the results are consumed as they are
+    yielded.
+
+    :param function: Function called with a dataframe and `args`, must be picklable.
+    :param dfs: Dataframes by key, either a mapping or an iterable of (key, dataframe) pairs.
+    :param args: Further arguments to the function, must be picklable.
+    :param n_jobs: Number of processes, defaults to the number of processors. With a single job, dataframes are
+        processed in order in the current process.
+    :param max_pending: Maximal number of submitted dataframes whose results are not yet yielded, defaults to twice
+        the number of processes.
+
+    :return: Iterator of (key, result) pairs, in order of completion.
+    """
+    items = iter(dfs.items() if isinstance(dfs, Mapping) else dfs)
+
+    if n_jobs == 1:
+        for key, df in items:
+            yield key, function(df, *args)
+        return
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    max_pending = 2 * n_jobs if max_pending is None else max_pending
+    if max_pending < 1:
+        raise ValueError(f'max_pending must be positive, got {max_pending}')
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending: Dict[Future, Hashable] = {}
+        submit(executor, pending, islice(items, max_pending), function, args)
+        while len(pending) > 0:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+            submit(executor, pending, islice(items, len(done)), function, args)
+
+
+def submit(executor: Executor, pending: Dict[Future, Hashable], items: Iterable[Tuple[Hashable, pd.DataFrame]],
+           function: Callable[..., Any], args: Tuple[Any, ...]) -> None:
+    for key, df in items:
+        pending[executor.submit(function, df, *args)] = key
+
+
+def build_many(dfs: DataFrames, component: ModelComponent, n_jobs: Optional[int] = None,
+               max_pending: Optional[int] = None) -> Iterator[Tuple[Hashable, pm.Model]]:
+    """
+    Build the same model specification for many dataframes in parallel, see :func:`fit_many`.
+
+    :param dfs: Dataframes by key, either a mapping or an iterable of (key, dataframe) pairs.
+    :param component: :class:`ModelComponent` to build the models from, which is left unbuilt.
+    :param n_jobs: Number of processes, see :func:`map_many`.
+    :param max_pending: Maximal number of dataframes being built at a time, see :func:`map_many`.
+
+    :return: Iterator of (key, :class:`pymc.Model`) pairs, in order of completion.
+    """
+    for key, pickled in map_many(build_pickled, dfs, component, n_jobs=n_jobs, max_pending=max_pending):
+        yield key, cloudpickle.loads(pickled)
+
+
+def fit_many(dfs: DataFrames, component: ModelComponent, fit: Callable[[pm.Model], Any] = sample,
+             n_jobs: Optional[int] = None, max_pending: Optional[int] = None) -> Iterator[Tuple[Hashable, Any]]:
+    """
+    Build and fit the same model specification for many dataframes in parallel. Each dataframe is built from its own
+    clone of the component, whose :class:`DataComponent` objects on the `obs` group take their values from the
+    columns of the dataframe with the same name (see :func:`bind_data`). The component itself is left unbuilt.
+
+    **Example**
+
+    .. highlight:: python
+    .. code-block:: python
+
+        def fit(model):
+            return pm.sample(model=model, cores=1, progressbar=False)
+
+        for unit, idata in fit_many(df.groupby('unit'), likelihood, fit):
+            idata.to_netcdf(f'{unit}.nc')
+
+    :param dfs: Dataframes by key, either a mapping or an iterable of (key, dataframe) pairs.
+    :param component: :class:`ModelComponent` to build the models from, must be picklable (e.g., functions used
+        by :func:`sakkara.model.f_` must be defined at module level).
+    :param fit: Function fitting a model, typically returning :class:`arviz.InferenceData`. Must be picklable.
+        Defaults to :func:`pymc.sample` with a single core per model.
+    :param n_jobs: Number of processes, see :func:`map_many`.
+    :param max_pending: Maximal number of dataframes being fitted at a time, see :func:`map_many`.
+
+    :return: Iterator of (key, result of fit) pairs, in order of completion.
+    """
+    return map_many(fit_one, dfs, component, fit, n_jobs=n_jobs, max_pending=max_pending)
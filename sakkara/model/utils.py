@@ -1,33 +1,192 @@
-import numpy as np
+import copy
+from collections import deque
+from typing import Iterator, List, Optional, Union
+
 import pandas as pd
 import pymc as pm
 
 from sakkara.model.base import ModelComponent
-from sakkara.relation.groupset import init
+from sakkara.profiler import record
+from sakkara.relation.groupset import init, GroupSet
+from sakkara.relation.groupset_cache import GroupSetCache
+
+# Attributes set when building a component
+BUILT_STATE = ('variable', 'representation', 'input_representation', 'base_representation',
+               'components_representation', 'minibatch_weights')
+
+
+def iterate_components(component: ModelComponent) -> Iterator[ModelComponent]:
+    """
+    Iterate over a component and all its underlying components, each component is visited once.
+
+    :param component: The component to start from.
+
+    :return: Iterator over the components, parents before their subcomponents.
+    """
+    visited = set()
+    stack = [component]
+    while len(stack) > 0:
+        current = stack.pop()
+        if id(current) in visited:
+            continue
+        visited.add(id(current))
+        yield current
+        stack.extend(reversed(current.get_subcomponents()))
+
+
+def topological_order(component: ModelComponent) -> List[ModelComponent]:
+    """
+    Sort a component and all its underlying components topologically, each component appears once.
+
+    :param component: The component to start from.
+
+    :return: List of the components, where each component is placed after all components it underlies.
+    """
+    components = list(iterate_components(component))
+
+    n_dependents = {id(c): 0 for c in components}
+    for c in components:
+        for subcomponent in {id(s): s for s in c.get_subcomponents()}.values():
+            n_dependents[id(subcomponent)] += 1
+
+    order = []
+    queue = deque([component])
+    while len(queue) > 0:
+        current = queue.popleft()
+        order.append(current)
+        for subcomponent in {id(s): s for s in current.get_subcomponents()}.values():
+            n_dependents[id(subcomponent)] -= 1
+            if n_dependents[id(subcomponent)] == 0:
+                queue.append(subcomponent)
+
+    return order
+
+
+def name_components(component: ModelComponent) -> None:
+    """
+    Assign names to all unnamed components underlying a component, in topological order such that each component is
+    named before naming its subcomponents.
+
+    :param component: The component to start from.
+    """
+    for c in topological_order(component):
+        c.name_subcomponents()
+
+
+def build_graph(component: ModelComponent, groupset: GroupSet) -> None:
+    """
+    Build a component and the underlying components reachable from it, in reversed topological order. Hence, each
+    component is built once, after all of its subcomponents. Underlying components that are already built are not
+    rebuilt, and structurally identical components (see :meth:`ModelComponent.get_structure`) share the variable of
+    the first one built.
+
+    :param component: The component to build.
+    :param groupset: Groups to be used for building all components of the model.
+    """
+    order = topological_order(component)
+    for c in order:
+        c.name_subcomponents()
+
+    for c in order:
+        c.validate()
+
+    # Component built in place of each component, and the built component of each structure
+    canonical = {}
+    structures = {}
+    for c in reversed(order):
+        if c.variable is not None and c is not component:
+            continue
+
+        structure = c.get_structure(lambda s: canonical.get(id(s), s))
+        if structure is not None and structure in structures:
+            canonical[id(c)] = structures[structure]
+            c.share_build(structures[structure])
+            continue
+
+        c.build(groupset)
+        if structure is not None:
+            structures[structure] = c
+
+
+def clone(component: ModelComponent) -> ModelComponent:
+    """
+    Copy a component and all its underlying components, without the variables and representations of any built
+    components. The copy can be built independently of the original, e.g., for another dataframe.
+
+    :param component: The component to copy.
+
+    :return: The unbuilt copy.
+    """
+    # Built state is shared instead of being copied, and then reset in the copy. Other attributes, e.g., tensor
+    # constants given as values, are copied even if built into the same variable
+    memo = {}
+    for c in iterate_components(component):
+        for attribute in BUILT_STATE:
+            value = getattr(c, attribute, None)
+            if value is not None:
+                memo[id(value)] = value
+
+    copied = copy.deepcopy(component, memo)
+    for c in iterate_components(copied):
+        for attribute in BUILT_STATE:
+            if hasattr(c, attribute):
+                setattr(c, attribute, None)
+    return copied
 
 
-def build(df: pd.DataFrame, component: ModelComponent):
+def init_groupset(df: Union[pd.DataFrame, GroupSet], component: ModelComponent,
+                  groupset_cache: Optional[GroupSetCache] = None) -> GroupSet:
+    """
+    Init the :class:`GroupSet` of all groups used by a component, including the `global` and `obs` groups.
+
+    :param df: :class:`pandas.DataFrame` containing columns defining groups used among :class:`ModelComponent` objects,
+        or a :class:`GroupSet` already containing the groups (e.g., from :func:`sakkara.model.ingest_chunks`).
+
+    :param component: :class:`ModelComponent` object to retrieve groups from.
+
+    :param groupset_cache: Cache to get the group set from, if the group columns are identical to a previous call.
+
+    :return: GroupSet of the groups.
+    """
+    groups = component.retrieve_groups().difference({'global', 'obs'})
+    if isinstance(df, GroupSet):
+        missing = groups.union({'global', 'obs'}).difference(df.groups)
+        if len(missing) > 0:
+            raise ValueError(f'Groups {sorted(missing)} are not in the group set')
+        # Copy, such that variables of models built from the same group set are not shared
+        return df.copy()
+
+    with record('init') as entry:
+        if groupset_cache is None:
+            groupset = init(df, sorted(groups), builtin_groups=True)
+        else:
+            groupset = groupset_cache.get(df, sorted(groups), builtin_groups=True)
+        entry.size = sum(m.nbytes for g in groupset.groups.values() for m in g.mapping.values())
+
+    return groupset
+
+
+def build(df: Union[pd.DataFrame, GroupSet], component: ModelComponent, groupset_cache: Optional[GroupSetCache] = None):
     """
     Build a complete PyMC model based on a single :class:`ModelComponent` (typically :class:`Likelihood`). Sakkara
     will trace all underlying components, and their respective groupings, necessary for creating the model.
 
-    :param df: :class:`pandas.DataFrame` containing columns defining groups used among :class:`ModelComponent` objects.
+    :param df: :class:`pandas.DataFrame` containing columns defining groups used among :class:`ModelComponent` objects,
+        or a :class:`GroupSet` of the groups, see :func:`init_groupset`.
 
     :param component: :class:`ModelComponent` object (of the lowest hierarchy, typically a :class:`Likelihood`) to init creation of PyMC model
         from.
 
+    :param groupset_cache: Cache of group sets, to skip deriving the groups when the group columns are identical to
+        a previous build. See :class:`sakkara.relation.groupset_cache.GroupSetCache`.
+
     :return: A PyMC model generated by the dataframe and component.
 
     :rtype: :class:`pymc.Model`
 
     """
-    tmp_df = df.copy()
-    tmp_df.loc[:, 'global'] = 'global'
-    tmp_df.loc[:, 'obs'] = np.arange(len(df))
-
-    groups = component.retrieve_groups().union({'global', 'obs'})
-    groupset = init(tmp_df.loc[:, list(groups)])
+    groupset = init_groupset(df, component, groupset_cache)
 
     with pm.Model(coords=groupset.coords()) as model:
-        component.build(groupset)
+        build_graph(component, groupset)
     return model
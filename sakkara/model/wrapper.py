@@ -1,6 +1,6 @@
 from abc import ABC
 from functools import cache
-from typing import Optional, Set
+from typing import Optional, Set, List
 
 from sakkara.model.base import ModelComponent
 from sakkara.model.math_op import MathOpBase
@@ -21,6 +21,9 @@ class WrapperComponent(MathOpBase, ABC):
     def set_name(self, name: str) -> None:
         return self.component.set_name(name)
 
+    def get_subcomponents(self) -> List[ModelComponent]:
+        return [self.component]
+
     def clear(self) -> None:
         self.component.clear()
         self.representation = None
@@ -0,0 +1,114 @@
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict
+from time import perf_counter
+from typing import Optional, List, Iterator, ContextManager
+
+import pandas as pd
+
+
+@dataclass
+class Record:
+    """
+    Measurement of a single build phase.
+
+    :param phase: Name of the phase, e.g., `prebuild` or `mapping`.
+    :param component: Description of the component or representations the phase was performed on.
+    :param size: Number of elements of the allocated arrays, or bytes for index arrays of groups and mappings.
+    :param time: Wall time of the phase, including nested phases.
+    :param self_time: Wall time of the phase, excluding nested phases.
+    """
+    phase: str
+    component: str
+    size: int = 0
+    time: float = 0.
+    self_time: float = 0.
+
+
+class BuildProfiler:
+    """
+    Collects :class:`Record` objects of all phases performed when building models.
+    """
+
+    def __init__(self):
+        self.records: List[Record] = []
+        self.stack: List[Record] = []
+
+    @contextmanager
+    def measure(self, phase: str, component: str = '') -> Iterator[Record]:
+        """
+        Context manager measuring the phase performed within it.
+
+        :param phase: Name of the phase.
+        :param component: Description of the component or representations the phase is performed on.
+
+        :return: The record of the phase, whose size may be set within the context.
+        """
+        entry = Record(phase, component)
+        self.stack.append(entry)
+        start = perf_counter()
+        try:
+            yield entry
+        finally:
+            entry.time = perf_counter() - start
+            # Nested phases have already subtracted their time from self_time
+            entry.self_time += entry.time
+            self.stack.pop()
+            if len(self.stack) > 0:
+                self.stack[-1].self_time -= entry.time
+            self.records.append(entry)
+
+    def report(self, per_component: bool = True) -> pd.DataFrame:
+        """
+        Summarize the records of the profiler.
+
+        :param per_component: Aggregate per component and phase if `True`, otherwise only per phase.
+
+        :return: :class:`pandas.DataFrame` with the number of calls, total time, self time and size, sorted by self
+            time in descending order.
+        """
+        records_df = pd.DataFrame([asdict(r) for r in self.records], columns=list(Record.__dataclass_fields__))
+        keys = ['component', 'phase'] if per_component else ['phase']
+        return records_df.groupby(keys).agg(calls=('time', 'count'),
+                                            time=('time', 'sum'),
+                                            self_time=('self_time', 'sum'),
+                                            size=('size', 'sum')).sort_values('self_time', ascending=False)
+
+
+active_profiler: Optional[BuildProfiler] = None
+
+
+@contextmanager
+def profile() -> Iterator[BuildProfiler]:
+    """
+    Profile all model builds performed within the context.
+
+    **Example**
+
+    .. highlight:: python
+    .. code-block:: python
+
+        from sakkara.profiler import profile
+
+        with profile() as profiler:
+            model = build(df, likelihood)
+
+        report_df = profiler.report()
+
+    :return: The profiler collecting the records.
+    """
+    global active_profiler
+    previous_profiler = active_profiler
+    active_profiler = BuildProfiler()
+    try:
+        yield active_profiler
+    finally:
+        active_profiler = previous_profiler
+
+
+def record(phase: str, component: str = '') -> ContextManager[Record]:
+    """
+    Record a phase to the active profiler, if any. See :meth:`BuildProfiler.measure`.
+    """
+    if active_profiler is None:
+        return nullcontext(Record(phase, component))
+    return active_profiler.measure(phase, component)
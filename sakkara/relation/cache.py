@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Tuple, Callable, Hashable, Any
+
+import numpy.typing as npt
+
+
+class MappingCache:
+    """
+    Least recently used cache of index arrays used for mapping between representations. The memory is bounded by the
+    total number of bytes of the cached arrays, the least recently used entries are evicted when exceeded. Also keeps
+    the variables resulting from mapping, so that each variable is mapped to each representation once.
+
+    :param max_bytes: Maximum total size of cached index arrays, in bytes.
+    """
+
+    def __init__(self, max_bytes: int = 2 ** 28):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.variables = {}
+
+    def get(self, key: Hashable, compute: Callable[[], Tuple[npt.NDArray[int], ...]]) -> Tuple[npt.NDArray[int], ...]:
+        """
+        Get the index arrays of a key, computed and inserted in cache if not already present.
+
+        :param key: Key of the mapping, e.g., group names of source and target representations.
+        :param compute: Callable computing the index arrays if not in cache.
+
+        :return: The index arrays for the key.
+        """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        indices = compute()
+        for index in indices:
+            # Cached arrays are shared between all mappings of the same key
+            index.flags.writeable = False
+
+        size = sum(index.nbytes for index in indices)
+        if size <= self.max_bytes:
+            self.entries[key] = indices
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= sum(index.nbytes for index in evicted)
+
+        return indices
+
+    def get_variable(self, variable: Any, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Get the result of mapping a variable, computed and inserted in cache if not already present. Unlike index
+        arrays, mapped variables are not evicted.
+
+        :param variable: The variable to map.
+        :param key: Key of the mapping, e.g., group names of source and target representations.
+        :param compute: Callable mapping the variable if not in cache.
+
+        :return: The mapped variable.
+        """
+        variable_key = (id(variable), key)
+        if variable_key not in self.variables:
+            # Keep a reference to the variable, so that its id is not reused while in cache
+            self.variables[variable_key] = (variable, compute())
+        return self.variables[variable_key][1]
+
+    def clear(self) -> None:
+        """
+        Remove all entries of the cache.
+        """
+        self.entries.clear()
+        self.variables.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self.entries
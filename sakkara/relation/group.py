@@ -1,27 +1,52 @@
-from typing import Any
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
 import numpy.typing as npt
-import pandas as pd
 import pytensor as pt
 from pymc.data import minibatch_index
 
+if TYPE_CHECKING:
+    from sakkara.relation.minibatch import MinibatchStrategy
+
+
+def get_code_dtype(n_members: int) -> np.dtype:
+    """
+    Get the smallest integer type of codes indexing members of a group.
+
+    :param n_members: Number of members of the group.
+
+    :return: The integer type.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_members - 1 <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
 
 class Group:
     """
     Class corresponding to a data frame column, with capabilities of handling relations to other groups.
 
     :param name: Name of the group, should be same as the column
-    :param members: The names of the unique column values, the members, ordered by their first appearance.
+    :param members: The names of the unique column values, the members, ordered by their first appearance. Use a
+        :class:`pandas.RangeIndex` for groups of consecutive integers, e.g., the rows of a dataframe, to avoid
+        materializing them.
+
+    Groups of the co-occurring member combinations of several groups (see
+    :meth:`sakkara.relation.groupset.GroupSet.get_combination`) have the names of these groups as `combination`, and
+    tuples of their members as members.
     """
-    def __init__(self, name: str, members: npt.NDArray[Any]):
+    def __init__(self, name: str, members: npt.ArrayLike):
         self.name = name
         self.members = members
         self.parents = set()
         self.children = set()
         self.twins = {self}
-        self.mapping = pd.DataFrame(index=members, data={name: np.arange(len(members))})
+        self.mapping: Dict[str, npt.NDArray[int]] = {}
         self.minibatch = None
+        self.minibatch_weights = None
+        self.mapping_cache = None
+        self.combination: Optional[Tuple[str, ...]] = None
 
     def add_child(self, child: 'Group') -> None:
         """
@@ -37,10 +62,11 @@ class Group:
 
         :param parent: The parent group
         :param parent_mapping: Indices of parent members (of the parent group), ordered by the corresponding member of
-            this group
+            this group. Not stored for parents with a single member, e.g., the `global` group.
         """
         self.parents.add(parent)
-        self.mapping[parent.name] = parent_mapping
+        if len(parent) > 1:
+            self.mapping[parent.name] = np.asarray(parent_mapping, dtype=get_code_dtype(len(parent)))
 
     def add_twin(self, twin: 'Group') -> None:
         """
@@ -49,14 +75,39 @@ class Group:
         :param twin: The twin group
         """
         self.twins.add(twin)
-        self.mapping[twin.name] = np.arange(len(self.mapping))
 
-    def get_minibatch(self, batch_size) -> pt.tensor.TensorVariable:
+    def get_mapping(self, name: str) -> npt.NDArray[int]:
+        """
+        Get the member indices of a parent or twin group (or this group itself), ordered by the corresponding member of
+        this group. Only mappings to parents with several members are stored, the identity mapping of twins and the
+        constant mapping to a parent with a single member are created on demand.
+
+        :param name: Name of the parent or twin group.
+
+        :return: Array of member indices.
+        """
+        if name in self.mapping:
+            return self.mapping[name]
+        if any(twin.name == name for twin in self.twins):
+            return np.arange(len(self), dtype=get_code_dtype(len(self)))
+        if any(parent.name == name for parent in self.parents):
+            return np.zeros(len(self), dtype=get_code_dtype(1))
+        raise KeyError(f'{name} is not a parent or twin of {self.name}')
+
+    def get_minibatch(self, batch_size: int, strategy: Optional['MinibatchStrategy'] = None) \
+            -> pt.tensor.TensorVariable:
         """
         Get a PyMC minibatch variable created from this group. Creates a new instance if not already created.
+
+        :param batch_size: Size of the mini-batch.
+        :param strategy: Strategy for sampling the mini-batch, defaults to uniform sampling. Weights of the sampled
+            members, if any, are stored in `minibatch_weights`.
         """
         if self.minibatch is None:
-            self.minibatch = minibatch_index(0, len(self), size=(batch_size,))
+            if strategy is None:
+                self.minibatch = minibatch_index(0, len(self), size=(batch_size,))
+            else:
+                self.minibatch, self.minibatch_weights = strategy.sample(self, batch_size)
         return self.minibatch
 
     def clear_minibatch(self) -> None:
@@ -64,13 +115,14 @@ class Group:
         Reset the minibatch variable of this group.
         """
         self.minibatch = None
+        self.minibatch_weights = None
 
 
     def __str__(self):
         return self.name
 
     def __len__(self):
-        return len(self.mapping)
+        return len(self.members)
 
     def __lt__(self, other) -> bool:
         return str(self) < str(other)
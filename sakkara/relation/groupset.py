@@ -1,18 +1,30 @@
-from dataclasses import dataclass
-from typing import Dict
+import struct
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Sequence, Set
 
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 
-from sakkara.relation.group import Group
+from sakkara.relation.cache import MappingCache
+from sakkara.relation.group import Group, get_code_dtype
 
 
 @dataclass(frozen=True)
 class GroupSet:
     """
     Set of group nodes used for PyMC model creation
+
+    :param groups: Dictionary of {<group name>: :class:`Group`}
+    :param mapping_cache: Cache of mapping index arrays between representations of the groups in this set.
     """
     groups: Dict[str, Group]
+    mapping_cache: MappingCache = field(default_factory=MappingCache, compare=False, repr=False)
+
+    def __post_init__(self):
+        for group in self.groups.values():
+            group.mapping_cache = self.mapping_cache
 
     def __getitem__(self, item: str):
         return self.groups[item]
@@ -20,74 +32,471 @@ class GroupSet:
     def coords(self) -> Dict[str, np.ndarray]:
         coords_dict = {}
         for k, v in self.groups.items():
-            coords_dict[k] = v.members
+            coords_dict[k] = get_coords(v)
         return coords_dict
 
+    def get_combination(self, names: Sequence[str]) -> Group:
+        """
+        Get the group whose members are the combinations of members of several groups that occur on the same row, e.g.,
+        the (store, week) pairs present in the data. Variables defined on this group scale with the number of
+        co-occurring combinations, rather than with the product of the group sizes. The group is created and added to
+        this set when first requested. It is a child of the combined groups (and of their parents and twins), and a
+        parent (or twin) of `obs`.
+
+        :param names: Names of the groups to combine.
+
+        :return: The combination group, named by the combined group names joined by `:`.
+        """
+        name = ':'.join(names)
+        if name in self.groups:
+            return self.groups[name]
+        if 'obs' not in self.groups:
+            raise ValueError('Combinations require the obs group, see init with builtin_groups')
+
+        obs = self.groups['obs']
+        groups = [self.groups[n] for n in names]
+        row_codes = [obs.get_mapping(n) for n in names]
+
+        combined = np.zeros(len(obs), dtype=np.int64)
+        for group, codes in zip(groups, row_codes):
+            # Renumber the combinations after each step, so the combined codes never exceed the number of rows
+            combined = pd.factorize(combined * len(group) + codes)[0]
+        combination_codes = combined.astype(get_code_dtype(combined.max(initial=0) + 1))
+        first_indices = get_first_indices(combination_codes)
+
+        members = np.empty(len(first_indices), dtype=object)
+        members[:] = list(zip(*(np.asarray(g.members)[c[first_indices]] for g, c in zip(groups, row_codes))))
+        combination = Group(name, members)
+        combination.combination = tuple(names)
+        combination.mapping_cache = self.mapping_cache
+
+        for group, codes in zip(groups, row_codes):
+            group_codes = codes[first_indices]
+            for parent in group.parents | group.twins:
+                if parent not in combination.parents:
+                    combination.add_parent(parent, group.get_mapping(parent.name)[group_codes])
+                    parent.add_child(combination)
+
+        if len(combination) == len(obs):
+            for twin in obs.twins:
+                twin.add_twin(combination)
+                combination.add_twin(twin)
+        else:
+            for child in obs.twins:
+                child.add_parent(combination, combination_codes)
+                combination.add_child(child)
+
+        self.groups[name] = combination
+        return combination
+
+    def copy(self) -> 'GroupSet':
+        """
+        Copy the groups and their relations, sharing the (read-only) members and mappings but with a new mapping cache
+        and no mini-batch variables. Hence, the copy can be used to build a model without affecting models built from
+        this group set.
+
+        :return: The copied group set.
+        """
+        copies = {}
+        for group in self.groups.values():
+            copies[id(group)] = Group(group.name, group.members)
+            copies[id(group)].mapping = dict(group.mapping)
+            copies[id(group)].combination = group.combination
+
+        def copied(related: Set[Group]) -> Set[Group]:
+            # Relations to groups outside this set, e.g., temporary prediction groups, are not copied
+            return {copies[id(g)] for g in related if id(g) in copies}
+
+        for group in self.groups.values():
+            copies[id(group)].parents = copied(group.parents)
+            copies[id(group)].children = copied(group.children)
+            copies[id(group)].twins = copied(group.twins)
+
+        return GroupSet({name: copies[id(group)] for name, group in self.groups.items()})
+
+    def save(self, path: str) -> None:
+        """
+        Save the groups, their members, mappings and relations to an uncompressed `.npz` file, which can be memory
+        mapped by :meth:`GroupSet.load`.
+
+        :param path: Path of the file.
+        """
+        groups = list({id(g): g for g in self.groups.values()}.values())
+        positions = {id(g): i for i, g in enumerate(groups)}
+
+        def edges(relation: str) -> npt.NDArray[int]:
+            pairs = [(i, positions[id(r)]) for i, g in enumerate(groups) for r in getattr(g, relation) if
+                     id(r) in positions and r is not g]
+            return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+        arrays = {'keys': np.array(list(self.groups.keys()), dtype=str),
+                  'key_groups': np.array([positions[id(g)] for g in self.groups.values()], dtype=np.int64),
+                  'names': np.array([g.name for g in groups], dtype=str),
+                  'parents': edges('parents'),
+                  'twins': edges('twins')}
+
+        names = [g.name for g in groups]
+        for i, group in enumerate(groups):
+            if group.combination is not None:
+                # Members are rebuilt from the mappings to the combined groups, rather than pickled as tuples
+                arrays[f'combination_{i}'] = np.array(group.combination, dtype=str)
+            elif isinstance(group.members, pd.RangeIndex):
+                arrays[f'range_{i}'] = np.array([group.members.start, group.members.stop, group.members.step])
+            else:
+                arrays[f'members_{i}'] = get_member_array(group.members)
+            for parent_name, mapping in group.mapping.items():
+                if parent_name in names:
+                    arrays[f'mapping_{i}_{names.index(parent_name)}'] = mapping
+
+        np.savez(path, **arrays)
+
+    @staticmethod
+    def load(path: str, mmap: bool = True, allow_pickle: bool = False) -> 'GroupSet':
+        """
+        Load a group set saved by :meth:`GroupSet.save`.
+
+        :param path: Path of the file.
+        :param mmap: Whether to memory map the mappings and members (except members that are not stored as numeric or
+            string arrays), rather than reading them into memory. Memory mapped arrays are read-only and shared
+            between processes loading the same file.
+        :param allow_pickle: Whether to load members that are neither numbers nor strings, which are stored pickled.
+            Unpickling may execute arbitrary code, only allow it for trusted files.
+
+        :return: The loaded group set.
+        """
+        arrays = load_npz(path, mmap, allow_pickle)
+
+        groups = []
+        for i, name in enumerate(arrays['names']):
+            if f'range_{i}' in arrays:
+                members = pd.RangeIndex(*map(int, arrays[f'range_{i}']))
+            else:
+                members = arrays.get(f'members_{i}')
+            groups.append(Group(str(name), members))
+            if f'combination_{i}' in arrays:
+                groups[-1].combination = tuple(map(str, arrays[f'combination_{i}']))
+
+        for key, array in arrays.items():
+            if key.startswith('mapping_'):
+                i, j = map(int, key.split('_')[1:])
+                groups[i].mapping[groups[j].name] = array
+
+        by_name = {g.name: g for g in groups}
+        for group in groups:
+            if group.combination is not None:
+                group.members = get_combination_members(group, [by_name[n] for n in group.combination])
+        for i, j in arrays['parents']:
+            groups[i].parents.add(groups[j])
+            groups[j].children.add(groups[i])
+        for i, j in arrays['twins']:
+            groups[i].twins.add(groups[j])
+
+        return GroupSet({str(k): groups[i] for k, i in zip(arrays['keys'], arrays['key_groups'])})
+
+
+def get_coords(group: Group) -> npt.ArrayLike:
+    """
+    Get the coordinates of a group in a PyMC model, i.e., its members, with members of combination groups as strings.
+    """
+    if group.combination is None:
+        return group.members
+    return np.array([str(m) for m in group.members])
+
+
+def get_combination_members(combination: Group, groups: Sequence[Group]) -> npt.NDArray[Any]:
+    """
+    Get the members of a combination group, i.e., tuples of members of the combined groups, from its mappings to the
+    combined groups.
+    """
+    members = np.empty(len(combination.mapping[groups[0].name]), dtype=object)
+    members[:] = list(zip(*(np.asarray(g.members)[combination.mapping[g.name]] for g in groups)))
+    return members
+
+
+def get_member_array(members: npt.ArrayLike) -> npt.NDArray[Any]:
+    """
+    Convert members to an array to save, using a string array for string members so that it can be memory mapped.
+    """
+    members = np.asarray(members)
+    if members.dtype == object and all(isinstance(m, str) for m in members):
+        return members.astype(str)
+    return members
+
+
+def load_npz(path: str, mmap: bool = True, allow_pickle: bool = False) -> Dict[str, npt.NDArray[Any]]:
+    """
+    Load the arrays of an `.npz` file. Unlike :func:`numpy.load`, arrays stored uncompressed are memory mapped.
+
+    :param path: Path of the file.
+    :param mmap: Whether to memory map the arrays, otherwise they are read into memory.
+    :param allow_pickle: Whether to load object arrays, which are stored pickled. Unpickling may execute arbitrary
+        code, only allow it for trusted files.
+
+    :return: Dictionary of {<array name>: <array>}.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if not mmap or info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=allow_pickle)
+                continue
+
+            # The array data follows the local file header of the member and the array header
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject or np.prod(shape) == 0:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=allow_pickle)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
 
-def get_parent_df(df: pd.DataFrame) -> pd.DataFrame:
+    return arrays
+
+
+def factorize(df: pd.DataFrame, columns: Optional[Sequence[str]] = None) -> Dict[str, npt.NDArray[int]]:
+    """
+    Encode each column of a dataframe as integer codes, where codes are assigned to unique values in order of first
+    appearance (i.e., the same order as :meth:`pandas.Series.unique`). Codes are stored in the smallest integer type
+    that fits the number of unique values.
+
+    :param df: Dataframe to factorize.
+    :param columns: Columns to factorize, defaults to all columns.
+
+    :return: Dictionary of {<column name>: <array of codes, one per row>}
+    """
+    codes = {}
+    for column in df.columns if columns is None else columns:
+        column_codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+        codes[column] = column_codes.astype(get_code_dtype(len(uniques)))
+    return codes
+
+
+def get_first_indices(codes: npt.NDArray[int]) -> npt.NDArray[int]:
+    """
+    Get the row indices where each code appears for the first time.
+
+    :param codes: Codes, as returned by :func:`factorize`.
+
+    :return: Array with the row of first appearance of each code, ordered by code.
+    """
+    # Codes are assigned in order of appearance, hence a code appears for the first time where it exceeds all preceding
+    previous_max = np.maximum.accumulate(np.concatenate(([-1], codes[:-1])))
+    return np.flatnonzero(codes > previous_max)
+
+
+def get_determination_df(codes: Dict[str, npt.NDArray[int]]) -> pd.DataFrame:
+    """
+    Create a matrix of functional dependencies between factorized columns.
+
+    :param codes: Codes of C columns, as returned by :func:`factorize`.
+
+    :return Dataframe of size CxC. Element (i,j) True means that the value of i always gives the value of j on the same
+    row.
+    """
+    groups = list(codes.keys())
+    n_uniques = {g: len(get_first_indices(c)) for g, c in codes.items()}
+    determination_df = pd.DataFrame(index=groups, columns=groups, data=False)
+
+    for i in groups:
+        first_indices = get_first_indices(codes[i])
+        for j in groups:
+            if i == j or n_uniques[j] > n_uniques[i]:
+                # More unique values of j than of i, can never be determined by i
+                continue
+            # Value of j at first appearance of each value of i, spread to all rows must reproduce j
+            determination_df.loc[i, j] = np.array_equal(codes[j][first_indices][codes[i]], codes[j])
+
+    return determination_df
+
+
+def get_parent_df(df: Optional[pd.DataFrame], determination_df: Optional[pd.DataFrame] = None,
+                  n_uniques: Optional[pd.Series] = None) -> pd.DataFrame:
     """
     Create a matrix of parent mappings between columns in a dataframe
 
-    :param df: Dataframe (with C columns) to base parent mappings of.
+    :param df: Dataframe (with C columns) to base parent mappings of, may be omitted if both `determination_df` and
+        `n_uniques` are given.
+    :param determination_df: Precomputed result of :func:`get_determination_df` for the dataframe, computed if omitted.
+    :param n_uniques: Precomputed number of unique values of each column, computed if omitted.
 
     :return Dataframe of size CxC with parent mappings. Rows are sorted from highest to lowest hierarchy level.
     Element (i,j) True means that j is a parent to i.
     """
-    groups = list(df.columns)
-    n_uniques = df.nunique(axis=0)
-    counts_df = pd.DataFrame(index=groups, columns=groups, data=False)
-    for i in range(len(groups)):
-        # Parent to child is when child value always gives parent value on same row, and there are more unique values of
-        # child
-        counts_df.loc[groups[i], groups[:i] + groups[i + 1:]] = np.logical_and(
-            df.groupby(groups[i]).nunique().max() == 1,
-            n_uniques[groups[i]] > n_uniques[groups[:i] + groups[i + 1:]])
+    if determination_df is None:
+        determination_df = get_determination_df(factorize(df))
+    if n_uniques is None:
+        n_uniques = df.nunique(axis=0)
+    n_uniques = n_uniques.loc[determination_df.columns]
+    # Parent to child is when child value always gives parent value on same row, and there are more unique values of
+    # child
+    counts_df = np.logical_and(determination_df,
+                               n_uniques.values.reshape(-1, 1) > n_uniques.values.reshape(1, -1))
 
     # Sort counts_df from the lowest child in the first row to the highest parent in the last row
     counts_df['rank'] = counts_df.sum(axis=1)
     counts_df.sort_values(by='rank', inplace=True, ascending=True)
-    return counts_df.loc[:, df.columns]
+    return counts_df.loc[:, determination_df.columns]
 
 
-def get_twin_df(df):
+def get_twin_df(df: pd.DataFrame, determination_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Create a matrix of twin relations between columns in a dataframe
 
     :param df: Dataframe (with C columns) to base twin mappings of.
+    :param determination_df: Precomputed result of :func:`get_determination_df` for the dataframe, computed if omitted.
 
     :return Dataframe of size CxC with twin mappings.
     """
-    groups = list(df.columns)
-    counts_df = pd.DataFrame(index=groups, columns=groups, data=False)
+    if determination_df is None:
+        determination_df = get_determination_df(factorize(df))
+
     # Twin is when both group a value always gives group b value on corresponding row, and vice versa
-    for i in range(len(groups)):
-        counts_df.loc[groups[i], groups[:i] + groups[i + 1:]] = df.groupby(groups[i]).nunique().max() == 1
-    return np.logical_and(counts_df, counts_df.T)
+    return np.logical_and(determination_df, determination_df.T)
 
 
-def init(df: pd.DataFrame) -> GroupSet:
+def init(df: pd.DataFrame, columns: Optional[Sequence[str]] = None, builtin_groups: bool = False) -> GroupSet:
     """
-    Init a group set from a dataframe
+    Init a group set from a dataframe, without copying it.
 
-    :param df: DataFrame containing only the group columns
+    :param df: DataFrame containing the group columns
+    :param columns: Group columns of the dataframe, defaults to all columns.
+    :param builtin_groups: Whether to add the `global` group, with the whole dataframe as the only member, and the `obs`
+        group, with each row as a member. Columns of the dataframe with these names are then ignored. The members of
+        `obs` are the row positions, represented as a :class:`pandas.RangeIndex` rather than a column. The relations of
+        these groups are known without inspecting the data: every group is a parent of `obs` and `global` is a parent of
+        every group, unless they are twins.
     :return: GroupSet created from the input DataFrame
     """
+    columns = list(df.columns if columns is None else columns)
+    if builtin_groups:
+        columns = [c for c in columns if c not in ('global', 'obs')]
+
+    codes = factorize(df, columns)
+    members = {column: df[column].iloc[get_first_indices(codes[column])].unique() for column in columns}
+    return init_codes(codes, members, len(df), builtin_groups)
+
+
+def init_chunks(chunks: Iterable[pd.DataFrame], columns: Sequence[str], builtin_groups: bool = False) -> GroupSet:
+    """
+    Init a group set from a dataframe given as consecutive chunks of rows, e.g., read from a partitioned file, that
+    need not fit in memory at once. Each chunk is read once, only the codes of the group columns are kept in memory.
+    The group set is the same as from :func:`init` on the concatenated chunks.
+
+    :param chunks: Iterable of dataframes containing the group columns.
+    :param columns: Group columns of the dataframes.
+    :param builtin_groups: Whether to add the `global` and `obs` groups, see :func:`init`.
+    :return: GroupSet created from the chunks
+    """
+    columns = [c for c in columns if not builtin_groups or c not in ('global', 'obs')]
+    chunk_codes = {column: [] for column in columns}
+    chunk_uniques = {column: [] for column in columns}
+
+    n_rows = 0
+    for chunk in chunks:
+        for column in columns:
+            codes, uniques = pd.factorize(chunk[column], use_na_sentinel=False)
+            chunk_codes[column].append(codes.astype(get_code_dtype(len(uniques))))
+            chunk_uniques[column].append(uniques)
+        n_rows += len(chunk)
+
+    if n_rows == 0:
+        raise ValueError('Chunks must contain at least one row')
+
+    codes = {}
+    members = {}
+    for column in columns:
+        # Reconcile the members of all chunks at once. Chunks are consecutive, hence factorizing the concatenated
+        # members of each chunk keeps the order of first appearance over all chunks
+        member_codes, members[column] = pd.factorize(chunk_uniques[column][0].append(chunk_uniques[column][1:]),
+                                                     use_na_sentinel=False)
+        member_codes = member_codes.astype(get_code_dtype(len(members[column])))
+        offsets = np.cumsum([0] + [len(u) for u in chunk_uniques[column]])
+        codes[column] = np.concatenate([member_codes[offset:][c] for offset, c in zip(offsets, chunk_codes[column])])
+        members[column] = members[column].values
+    return init_codes(codes, members, n_rows, builtin_groups)
+
+
+def init_codes(codes: Dict[str, npt.NDArray[int]], members: Dict[str, npt.ArrayLike], n_rows: int,
+               builtin_groups: bool = False) -> GroupSet:
+    """
+    Init a group set from factorized group columns.
+
+    :param codes: Codes of the group columns, as returned by :func:`factorize`.
+    :param members: Members of each group column, ordered by code.
+    :param n_rows: Number of rows of the dataframe.
+    :param builtin_groups: Whether to add the `global` and `obs` groups, see :func:`init`.
+    :return: GroupSet of the group columns
+    """
+    first_indices = {column: get_first_indices(c) for column, c in codes.items()}
+    groups = {column: Group(column, members[column]) for column in codes}
 
-    groups = {column: Group(column, df[column].unique()) for column in df.columns}
+    determination_df = get_determination_df(codes)
+    n_uniques = pd.Series({column: len(group) for column, group in groups.items()}, dtype=int)
 
-    parent_df = get_parent_df(df)
-    for i, (group_name, is_parent) in enumerate(parent_df.iterrows()):
-        # Create data frame with only rows with first appearance of each unique value of group column
-        map_df = df.set_index(group_name)
-        map_df = map_df.loc[~map_df.index.duplicated(keep='first'), :]
-        for parent_name in df.columns[is_parent]:
-            parent_mapping = groups[parent_name].mapping.loc[map_df[parent_name], parent_name]
-            groups[group_name].add_parent(groups[parent_name], parent_mapping.values)
+    parent_df = get_parent_df(None, determination_df, n_uniques)
+    for group_name, is_parent in parent_df.iterrows():
+        for parent_name in parent_df.columns[is_parent]:
+            # Parent member index at the first appearance of each member of the group
+            parent_mapping = codes[parent_name][first_indices[group_name]]
+            groups[group_name].add_parent(groups[parent_name], parent_mapping)
             groups[parent_name].add_child(groups[group_name])
 
-    twin_df = get_twin_df(df)
+    twin_df = get_twin_df(None, determination_df)
     for group_name, is_twin in twin_df.iterrows():
-        for twin_name in df.columns[is_twin]:
+        for twin_name in twin_df.columns[is_twin]:
             groups[group_name].add_twin(groups[twin_name])
 
+    if builtin_groups:
+        add_obs_group(groups, codes, n_rows)
+        add_global_group(groups)
+
     return GroupSet(groups)
+
+
+def add_obs_group(groups: Dict[str, Group], codes: Dict[str, npt.NDArray[int]], n_rows: int) -> None:
+    """
+    Add the `obs` group, with each row of the dataframe as member, to a dictionary of groups. The relations to the
+    other groups are given by the codes of each row: a group with one member per row is a twin of `obs`, any other
+    group is a parent of `obs` with the codes as mapping.
+
+    :param groups: Dictionary of {<group name>: :class:`Group`} to add the `obs` group to.
+    :param codes: Codes of the groups, as returned by :func:`factorize`.
+    :param n_rows: Number of rows of the dataframe.
+    """
+    obs = Group('obs', pd.RangeIndex(n_rows))
+    for group_name, group in list(groups.items()):
+        if len(group) == n_rows:
+            obs.add_twin(group)
+            group.add_twin(obs)
+        else:
+            obs.add_parent(group, codes[group_name])
+            group.add_child(obs)
+    groups['obs'] = obs
+
+
+def add_global_group(groups: Dict[str, Group]) -> None:
+    """
+    Add the `global` group, with the whole dataframe as the only member, to a dictionary of groups. A group with a
+    single member is a twin of `global`, any other group is a child of `global`.
+
+    :param groups: Dictionary of {<group name>: :class:`Group`} to add the `global` group to.
+    """
+    global_group = Group('global', np.array(['global']))
+    for group in list(groups.values()):
+        if len(group) == 1:
+            global_group.add_twin(group)
+            group.add_twin(global_group)
+        else:
+            group.add_parent(global_group, np.zeros(len(group), dtype=get_code_dtype(1)))
+            global_group.add_child(group)
+    groups['global'] = global_group
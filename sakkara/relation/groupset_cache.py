@@ -0,0 +1,147 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import pandas as pd
+
+from sakkara.relation.groupset import GroupSet, get_member_array, init
+
+
+def fingerprint(df: pd.DataFrame, columns: Sequence[str], builtin_groups: bool = False) -> str:
+    """
+    Hash the group columns of a dataframe, such that dataframes with the same fingerprint give the same group set.
+    Only the group columns are hashed, by their names, types and values on each row.
+
+    :param df: Dataframe containing the group columns.
+    :param columns: Group columns of the dataframe.
+    :param builtin_groups: Whether the group set has the builtin groups, see :func:`sakkara.relation.groupset.init`.
+
+    :return: Hexadecimal digest of the hash.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((len(df), builtin_groups)).encode())
+    for column in columns:
+        digest.update(repr((column, str(df[column].dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(df[column], index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def requires_pickle(groupset: GroupSet) -> bool:
+    """
+    Check if saving a group set pickles any members, see :meth:`sakkara.relation.groupset.GroupSet.save`.
+    """
+    return any(group.combination is None and not isinstance(group.members, pd.RangeIndex) and
+               get_member_array(group.members).dtype.hasobject for group in groupset.groups.values())
+
+
+class GroupSetCache:
+    """
+    Least recently used cache of group sets, keyed by the :func:`fingerprint` of the group columns. Repeated builds
+    on dataframes with the same group columns, e.g., cross-validation folds or re-fits with new data columns, then
+    skip :func:`sakkara.relation.groupset.init`. Optionally, group sets are also stored on disk, so that they are
+    reused between sessions and memory mapped (see :meth:`sakkara.relation.groupset.GroupSet.save`).
+
+    Each lookup gives a copy of the cached group set (see :meth:`sakkara.relation.groupset.GroupSet.copy`), hence
+    models built from the same cached group set do not share any variables.
+
+    **Example**
+
+    .. highlight:: python
+    .. code-block:: python
+
+        cache = GroupSetCache(directory='groupsets')
+        for train_df in folds:
+            model = build(train_df, likelihood, groupset_cache=cache)
+
+    :param max_entries: Maximum number of group sets kept in memory.
+    :param directory: Directory to store group sets in, not stored on disk if omitted.
+    :param allow_pickle: Whether to store and load group sets with members that are neither numbers nor strings,
+        which are pickled. Unpickling may execute arbitrary code, only allow it for trusted directories. Otherwise,
+        such group sets are only kept in memory.
+    """
+
+    def __init__(self, max_entries: int = 16, directory: Optional[str] = None, allow_pickle: bool = False):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.allow_pickle = allow_pickle
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, df: pd.DataFrame, columns: Optional[Sequence[str]] = None, builtin_groups: bool = False) -> GroupSet:
+        """
+        Get the group set of a dataframe, initialized and inserted in cache if not already present.
+
+        :param df: DataFrame containing the group columns.
+        :param columns: Group columns of the dataframe, defaults to all columns.
+        :param builtin_groups: Whether to add the `global` and `obs` groups, see
+            :func:`sakkara.relation.groupset.init`.
+
+        :return: Copy of the cached group set.
+        """
+        columns = list(df.columns if columns is None else columns)
+        key = fingerprint(df, columns, builtin_groups)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key].copy()
+
+        groupset = self.load(key)
+        if groupset is None:
+            self.misses += 1
+            groupset = init(df, columns, builtin_groups)
+            self.store(key, groupset)
+        else:
+            self.hits += 1
+
+        self.entries[key] = groupset
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        return groupset.copy()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def load(self, key: str) -> Optional[GroupSet]:
+        """
+        Load a group set from disk.
+
+        :param key: Fingerprint of the group set.
+
+        :return: The group set, or `None` if not stored.
+        """
+        if self.directory is None or not os.path.exists(self.get_path(key)):
+            return None
+        return GroupSet.load(self.get_path(key), allow_pickle=self.allow_pickle)
+
+    def store(self, key: str, groupset: GroupSet) -> None:
+        """
+        Store a group set on disk, if a directory is given.
+
+        :param key: Fingerprint of the group set.
+        :param groupset: The group set to store.
+        """
+        if self.directory is None or (not self.allow_pickle and requires_pickle(groupset)):
+            return
+        # Write to a temporary file first, so that concurrent readers never see a partially written file
+        path = self.get_path(key)
+        temporary_path = f'{path[:-len(".npz")]}.{os.getpid()}.tmp.npz'
+        groupset.save(temporary_path)
+        os.replace(temporary_path, path)
+
+    def clear(self) -> None:
+        """
+        Remove all group sets from memory (but not from disk).
+        """
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: str):
+        return key in self.entries
@@ -0,0 +1,205 @@
+import abc
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pytensor.tensor as pt
+from pymc.data import minibatch_index
+
+from sakkara.relation.group import Group
+
+
+class MinibatchStrategy(abc.ABC):
+    """
+    Abstract class for strategies of sampling members of a group into mini-batches.
+
+    A strategy yields the indices of the sampled members, and optionally a weight per sampled member. The weights
+    are chosen such that the weighted log-likelihood of a mini-batch is an unbiased estimate of the log-likelihood of
+    all members. Strategies without weights sample uniformly, and are scaled by the total size of the group.
+    """
+
+    weighted = True
+
+    @abc.abstractmethod
+    def sample(self, group: Group, batch_size: int) -> Tuple[pt.TensorVariable, Optional[pt.TensorVariable]]:
+        """
+        Create mini-batch variables for a group.
+
+        :param group: Group whose members to sample.
+        :param batch_size: Size of mini-batch.
+
+        :return: Indices of sampled members, and the weight of each sampled member (`None` if not weighted).
+        """
+        raise NotImplementedError
+
+
+class UniformMinibatch(MinibatchStrategy):
+    """
+    Sample members uniformly with replacement. Requires iid data.
+    """
+
+    weighted = False
+
+    def sample(self, group: Group, batch_size: int) -> Tuple[pt.TensorVariable, Optional[pt.TensorVariable]]:
+        return minibatch_index(0, len(group), size=(batch_size,)), None
+
+
+class StratifiedMinibatch(MinibatchStrategy):
+    """
+    Sample a fixed number of members from each member of a parent group, uniformly with replacement within each
+    stratum.
+
+    :param by: Name of the group to stratify by, must be a parent of the group being sampled.
+    :param allocation: How to allocate the batch between the strata, either 'equal' (same size per stratum) or
+        'proportional' (proportional to the size of each stratum, at least one per stratum).
+    """
+
+    def __init__(self, by: str, allocation: str = 'equal'):
+        if allocation not in ('equal', 'proportional'):
+            raise ValueError(f"Allocation must be 'equal' or 'proportional', got '{allocation}'")
+        self.by = by
+        self.allocation = allocation
+
+    def allocate(self, counts: npt.NDArray[int], batch_size: int) -> npt.NDArray[int]:
+        """
+        Allocate the mini-batch between the strata.
+
+        :param counts: Number of members of each stratum.
+        :param batch_size: Size of mini-batch.
+
+        :return: Number of sampled members of each stratum.
+        """
+        if batch_size < len(counts):
+            raise ValueError(f'Batch size {batch_size} is smaller than the number of strata {len(counts)}')
+
+        if self.allocation == 'equal':
+            return batch_size // len(counts) + (np.arange(len(counts)) < batch_size % len(counts))
+
+        # Largest remainder allocation of what is left after one member per stratum
+        quota = (batch_size - len(counts)) * counts / counts.sum()
+        allocation = 1 + np.floor(quota).astype(int)
+        remainder = batch_size - allocation.sum()
+        allocation[np.argsort(np.floor(quota) - quota, kind='stable')[:remainder]] += 1
+        return allocation
+
+    def sample(self, group: Group, batch_size: int) -> Tuple[pt.TensorVariable, Optional[pt.TensorVariable]]:
+        counts, order, starts = get_strata(group, self.by)
+        allocation = self.allocate(counts, batch_size)
+
+        slot_strata = np.repeat(np.arange(len(counts)), allocation)
+        offsets = minibatch_index(0, counts[slot_strata], size=(batch_size,))
+        index = pt.as_tensor(order)[starts[slot_strata] + offsets]
+
+        return index, pt.as_tensor((counts / allocation)[slot_strata])
+
+
+class GroupMinibatch(MinibatchStrategy):
+    """
+    Sample whole members of a parent group uniformly with replacement, including all of their members in the
+    mini-batch. The batch size is the number of parent members per mini-batch.
+
+    Mini-batches have a fixed shape: each sampled parent member occupies as many slots as the largest one, and the
+    slots beyond its own members are given zero weight.
+
+    :param by: Name of the group whose members to sample, must be a parent of the group being sampled.
+    """
+
+    def __init__(self, by: str):
+        self.by = by
+
+    def sample(self, group: Group, batch_size: int) -> Tuple[pt.TensorVariable, Optional[pt.TensorVariable]]:
+        counts, order, starts = get_strata(group, self.by)
+        slots = np.arange(counts.max())
+
+        chosen = minibatch_index(0, len(counts), size=(batch_size,))
+        chosen_counts = pt.as_tensor(counts)[chosen][:, None]
+
+        index = pt.as_tensor(order)[(pt.as_tensor(starts)[chosen][:, None] + slots % chosen_counts).ravel()]
+        weights = (pt.lt(slots, chosen_counts) * (len(counts) / batch_size)).ravel()
+
+        return index, weights
+
+
+class ImportanceMinibatch(MinibatchStrategy):
+    """
+    Sample members of a parent group with replacement by given importance, then a member uniformly within it. Use the
+    group being sampled itself as `by` to give each of its members an importance.
+
+    :param by: Name of the group to assign importance to, must be a parent or twin of the group being sampled.
+    :param importance: Importance of each member of `by`, defaults to equal importance of all members.
+    :param resolution: Resolution of the sampling probabilities, which are rounded to multiples of its inverse.
+    """
+
+    def __init__(self, by: str, importance: Optional[Dict[Any, float]] = None, resolution: int = 2 ** 24):
+        self.by = by
+        self.importance = importance
+        self.resolution = resolution
+
+    def get_tickets(self, group: Group) -> npt.NDArray[int]:
+        """
+        Get the number of tickets of each member of `by`, of which one is drawn per sampled member.
+
+        :param group: Group whose members to sample.
+
+        :return: Integer proportional to the probability of sampling each member of `by`.
+        """
+        by_group = get_related_group(group, self.by)
+        if self.importance is None:
+            return np.ones(len(by_group), dtype=int)
+
+        importance = pd.Series(self.importance, dtype=float).reindex(by_group.members)
+        if importance.isna().any() or (importance <= 0).any():
+            raise ValueError(f'Importance must be positive and given for all members of {self.by}')
+
+        return np.maximum(1, np.round(importance.values / importance.sum() * self.resolution)).astype(int)
+
+    def sample(self, group: Group, batch_size: int) -> Tuple[pt.TensorVariable, Optional[pt.TensorVariable]]:
+        counts, order, starts = get_strata(group, self.by)
+        tickets = self.get_tickets(group)
+        cumulative_tickets = np.cumsum(tickets)
+
+        ticket = minibatch_index(0, cumulative_tickets[-1], size=(batch_size,))
+        strata = pt.searchsorted(cumulative_tickets, ticket, side='right')
+        offsets = minibatch_index(0, pt.as_tensor(counts)[strata], size=(batch_size,))
+        index = pt.as_tensor(order)[pt.as_tensor(starts)[strata] + offsets]
+
+        # Inverse of the expected number of times each member is sampled
+        weights = cumulative_tickets[-1] * counts / (batch_size * tickets)
+        return index, pt.as_tensor(weights)[strata]
+
+
+def get_related_group(group: Group, name: str) -> Group:
+    """
+    Get a parent or twin of a group by name.
+
+    :param group: Group to search the relations of.
+    :param name: Name of the related group.
+
+    :return: The related group.
+    """
+    for related in group.parents | group.twins:
+        if related.name == name:
+            return related
+    raise ValueError(f'{name} is not a parent or twin of {group.name}')
+
+
+def get_strata(group: Group, by: str) -> Tuple[npt.NDArray[int], npt.NDArray[int], npt.NDArray[int]]:
+    """
+    Partition the members of a group by the members of a parent or twin group.
+
+    :param group: Group to partition.
+    :param by: Name of the parent or twin group to partition by.
+
+    :return: Number of members in each stratum, indices of members ordered by stratum, and the position in the
+        ordering where each stratum starts.
+    """
+    by_group = get_related_group(group, by)
+    codes = group.get_mapping(by)
+    counts = np.bincount(codes, minlength=len(by_group))
+    if np.any(counts == 0):
+        raise ValueError(f'All members of {by} must have members of {group.name}')
+
+    order = np.argsort(codes, kind='stable')
+    starts = np.cumsum(counts) - counts
+    return counts, order, starts
@@ -4,7 +4,13 @@ from typing import Tuple, Any, List, Dict, Optional
 
 import numpy as np
 import numpy.typing as npt
+import pandas as pd
 
+import pytensor.tensor as pt
+from pytensor.graph import Variable
+
+from sakkara.profiler import record
+from sakkara.relation.cache import MappingCache
 from sakkara.relation.group import Group
 
 
@@ -62,6 +68,21 @@ class Representation:
         """
         raise NotImplementedError
 
+    def map_subset(self, element: Any, target_representation: 'Representation', index: Any) -> Any:
+        """
+        Map an element to the members of a target representation at given positions along its first axis, i.e., the
+        same as `map(element, target_representation)[index]`, but without mapping the other members.
+
+        :param element: The object/variable to transform.
+
+        :param target_representation: The representation that corresponds to the shape the variable should be in.
+
+        :param index: Positions along the first axis of the target representation, e.g., a mini-batch index variable.
+
+        :return: The element transformed to the positions of the target representation.
+        """
+        return self.map(element, target_representation)[index]
+
 
 def one_to_one_mapping(group: Group, target: Representation) -> Optional[Group]:
     # Get mapping if g is parent or twin to any group of target representation
@@ -72,55 +93,63 @@ def one_to_one_mapping(group: Group, target: Representation) -> Optional[Group]:
     return None
 
 
-def subset_prod(remain: int, candidates: npt.NDArray[Group]) -> Tuple[bool, npt.NDArray[Group]]:
+def one_to_combination_mapping(group: Group, target: Representation) -> Tuple[Group, ...]:
     """
-    Solve the subset product, e.g., select a subset of candidate values whose product equals remain
+    Find a combination of (parent) groups of target representation that corresponds to the same information as in group
     """
-    for ix, c in enumerate(candidates):
-        if remain % len(c) == 0 and len(c) <= remain:
-            # We have found candidate
-            break
-    else:
-        # No candidate can be in solution set
-        return False, []
-
-    if remain == len(c):
-        # We have found a single candidate satisfying the conditions
-        return True, [c]
-
-    # Test whether c can be combined with other candidates to make up for remain
-    ok, arr = subset_prod(remain // len(c), candidates[ix + 1:])
-
-    if ok:
-        # c could successfully be multiplied together with subset of subsequent candidates to get remain
-        arr.append(c)
-        return ok, arr
-    else:
-        # c can not be in solution, start over with reduced list of candidates
-        return subset_prod(remain, candidates[ix + 1:])
+    positions, _ = get_combination_lookup(group, target)
+    return tuple(target.get_groups()[i] for i in positions)
 
 
-def one_to_combination_mapping(group: Group, target: Representation) -> Tuple[Group, ...]:
+def get_combination_lookup(group: Group, target: Representation) -> Tuple[npt.NDArray[int], npt.NDArray[int]]:
     """
-    Find a combination of (parent) groups of target representation that corresponds to the same information as in group
+    Get the combination of parent groups of target representation identifying the members of group, see
+    :func:`compute_combination_lookup`. Retrieved from the mapping cache of the group, if any.
     """
+    cache = group.mapping_cache
+    if cache is None:
+        return compute_combination_lookup(group, target)
+
+    key = ('combination', str(group), tuple(map(str, target.get_groups())))
+    return cache.get(key, lambda: compute_combination_lookup(group, target))
 
-    # Check if any combination of parents to g is equivalent representation
-    def is_candidate(target_group):
-        return group in target_group.children and not len(group) % len(target_group)
 
-    all_target_groups = np.array(target.get_groups())
+def compute_combination_lookup(group: Group, target: Representation) -> Tuple[npt.NDArray[int], npt.NDArray[int]]:
+    """
+    Find a minimal combination of parent groups of target representation, whose member combinations uniquely identify
+    the members of group. Starting from all parents, parents are removed one at a time (smallest first) as long as
+    the remaining combination still identifies the members.
 
-    # Filter candidate groups that might form the representation
-    candidate_groups = all_target_groups[np.vectorize(is_candidate)(target.get_groups())]
+    :param group: Group to map from.
+    :param target: Representation to map to.
 
-    if len(group) % int(np.prod([len(t) for t in candidate_groups])) != 0:
+    :return: Positions of the combined groups in the target representation, and lookup array from each combination
+        of their member indices to the member index of group (-1 for combinations without a member).
+    """
+    target_groups = target.get_groups()
+    # Parents with a single member never contribute to identifying members
+    candidates = [i for i, t in enumerate(target_groups) if t in group.parents and len(t) > 1]
+    codes = {i: group.get_mapping(target_groups[i].name) for i in candidates}
+
+    def is_identifying(positions: List[int]) -> bool:
+        combined = np.zeros(len(group), dtype=np.int64)
+        for i in positions:
+            # Renumber the combinations after each step, so the combined codes never exceed the number of members
+            combined = pd.factorize(combined * len(target_groups[i]) + codes[i])[0]
+        return len(positions) > 0 and combined.max(initial=-1) + 1 == len(group)
+
+    if not is_identifying(candidates):
         raise ValueError('Group is not mappable to target representation')
 
-    # Find a subset of candidates so that the product of their sizes equal the size of g
-    _, mapped_groups = subset_prod(len(group), candidate_groups)
+    selected = list(candidates)
+    for i in sorted(candidates, key=lambda c: len(target_groups[c])):
+        reduced = [j for j in selected if j != i]
+        if is_identifying(reduced):
+            selected = reduced
 
-    return tuple(mapped_groups)
+    lookup = np.full(tuple(len(target_groups[i]) for i in selected), -1, dtype=int)
+    lookup[tuple(codes[i] for i in selected)] = np.arange(len(group))
+    return np.array(selected, dtype=int), lookup
 
 
 class UnrepeatableRepresentation(Representation, ABC):
@@ -203,26 +232,55 @@ class TensorRepresentation(Representation, ABC):
         return len(self.groups) == len(other.get_groups()) and all(
             map(lambda x, y: x in y.twins, self.groups, other.get_groups()))
 
-    def get_member_array(self, group: Group) -> npt.NDArray[Any]:
+    def get_index_array(self, group: Group) -> npt.NDArray[int]:
+        """
+        Get an array shaped as a variable with this representation, where each value is the index of the member of
+        the input group. Same as :meth:`TensorRepresentation.get_member_array`, but with member indices instead of
+        member values.
+        """
         if group not in self.groups:
             raise ValueError('Group is not found in this representation')
 
         group_index = self.groups.index(group)
-        # Get shape of representation, but target_group excluded
-        other_shape = self.get_shape()[:group_index] + self.get_shape()[group_index + 1:]
-        # Create flat array or target_group members repeated, as if i == 0
-        member_array = np.repeat(group.members, np.prod(other_shape))
-        # Reshape target_members to have the same order as target's representation
-        member_array = member_array.reshape((len(group),) + other_shape)
-        # Swap i:th and 0:th axes to handle the case when i != 0
-        member_array = np.swapaxes(member_array, 0, group_index)
+        # Shape with ones everywhere but along the axis of group, broadcast to the full shape without copying
+        axis_shape = tuple(len(group) if i == group_index else 1 for i in range(len(self.groups)))
+        return np.broadcast_to(np.arange(len(group)).reshape(axis_shape), self.get_shape())
 
-        return member_array
+    def get_member_array(self, group: Group) -> npt.NDArray[Any]:
+        return np.asarray(group.members)[self.get_index_array(group)]
 
-    def map(self, element: Any, target: Representation) -> Any:
-        if self == target:
-            return element
+    def get_mapping_indices(self, target: 'TensorRepresentation') -> Tuple[npt.NDArray[int], ...]:
+        """
+        Get the integer index arrays that transform a variable of this representation to the target representation.
+        Index arrays are retrieved from the mapping cache of the groups' :class:`GroupSet`, if any.
 
+        :param target: The representation to map to.
+
+        :return: Tuple with one index array per group of this representation, each shaped as the target
+            representation.
+        """
+        cache = self.get_mapping_cache()
+        if cache is None:
+            return self.compute_mapping_indices(target)
+
+        return cache.get(self.get_mapping_key(target), lambda: self.compute_mapping_indices(target))
+
+    def get_mapping_cache(self) -> Optional[MappingCache]:
+        """
+        Get the mapping cache of the groups of this representation, if any.
+        """
+        return self.groups[0].mapping_cache if len(self.groups) > 0 else None
+
+    def get_mapping_key(self, target: Representation) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """
+        Get the key identifying the mapping to a target representation in the mapping cache.
+        """
+        return tuple(map(str, self.groups)), tuple(map(str, target.get_groups()))
+
+    def compute_mapping_indices(self, target: 'TensorRepresentation') -> Tuple[npt.NDArray[int], ...]:
+        """
+        Compute the index arrays of :meth:`TensorRepresentation.get_mapping_indices`, without caching.
+        """
         mapping_dict = self.get_group_mapping(target)
 
         mapping = []
@@ -231,26 +289,57 @@ class TensorRepresentation(Representation, ABC):
             target_groups = mapping_dict[group]
 
             if len(target_groups) == 1:
-                # One to one mapping means that mapped group is a twin or child to group
+                # One to one mapping means that mapped group is a twin or child to group, gather the member indices of
+                # group from the mapping of the target group
                 mapped_group = target_groups[0]
-                # Get the array of members of target group, shaped according to target representation but ravelled
-                target_members = target.get_member_array(mapped_group).ravel()
-                mapping_df = mapped_group.mapping
-
+                group_indices = mapped_group.get_mapping(group.name)[target.get_index_array(mapped_group)]
             else:
-                # One to combination mapping means that mapped groups are all parent to the group
-                mapping_df = group.mapping.copy()
-                for m in target_groups:
-                    mapping_df[str(m)] = m.mapping.iloc[mapping_df[str(m)].values].index.values
-                mapping_df = mapping_df.set_index(list(map(str, target_groups)))
-                target_members = [tuple(x) for x in zip(*[target.get_member_array(m).ravel() for m in target_groups])]
+                # One to combination mapping means that mapped groups are all parent to the group. Use lookup table
+                # from each combination of parent member indices into member index of group
+                _, lookup = get_combination_lookup(group, target)
+                group_indices = lookup[tuple(target.get_index_array(m) for m in target_groups)]
 
-            # Fetch mapping from target_members into members of group
-            group_indices = np.array([mapping_df.loc[t, group.name] for t in target_members])
-            # Append mapping, reshaped to target representation's shape
-            mapping.append(group_indices.reshape(target.get_shape()))
+                if np.any(group_indices < 0):
+                    raise ValueError('Group is not mappable to target representation')
+
+            mapping.append(group_indices)
+
+        return tuple(mapping)
+
+    def map(self, element: Any, target: Representation) -> Any:
+        if self == target:
+            return element
+
+        cache = self.get_mapping_cache()
+        if cache is not None and isinstance(element, Variable):
+            # Mapping the same variable to the same target twice gives the same variable
+            return cache.get_variable(element, self.get_mapping_key(target), lambda: self.map_indices(element, target))
+
+        return self.map_indices(element, target)
+
+    def map_indices(self, element: Any, target: Representation) -> Any:
+        """
+        Map an element to a target representation by indexing it with the mapping indices, without reusing previously
+        mapped variables.
+        """
+        with record('mapping', f'{tuple(map(str, self.groups))} -> {tuple(map(str, target.get_groups()))}') as entry:
+            indices = self.get_mapping_indices(target)
+            entry.size = sum(index.nbytes for index in indices)
+            if isinstance(element, Variable):
+                # Indexing a variable by arrays inspects each index in Python, unlike indexing by tensors
+                return element[tuple(pt.as_tensor(i) for i in indices)]
+            return element[indices]
+
+    def map_subset(self, element: Any, target: Representation, index: Any) -> Any:
+        if self == target:
+            return element[index]
 
-        return element[tuple(mapping)]
+        # Compose the mapping with the index, such that only the indexed members are gathered from the element
+        with record('mapping', f'{tuple(map(str, self.groups))} -> {tuple(map(str, target.get_groups()))}[index]') \
+                as entry:
+            indices = self.get_mapping_indices(target)
+            entry.size = sum(i.nbytes for i in indices)
+            return element[tuple(pt.as_tensor(i)[index] for i in indices)]
 
     def get_members(self) -> Tuple[npt.NDArray, ...]:
         if len(self.groups) == 0:
@@ -260,10 +349,7 @@ class TensorRepresentation(Representation, ABC):
     def get_member_tuples(self) -> List[Tuple[Any, ...]]:
         if len(self.groups) == 0:
             raise ValueError('This representation does not hold any groups')
-        if len(self.groups) == 1:
-            return [(x,) for x in np.ravel(self.get_members()[0])]
-        else:
-            return [(x,) for x in zip(map(np.ravel, self.get_members()))]
+        return list(zip(*map(np.ravel, self.get_members())))
 
 
 class MinimalTensorRepresentation(TensorRepresentation, ABC):
@@ -171,3 +171,73 @@ def test_reduction():
         abcd.build(gs)
         sample = pm.draw(abcd.variable)
         assert sample.shape == (3, 2) or sample.shape == (2, 3)
+
+
+def test_sparse_groups():
+    # Crossed groups where most combinations are absent
+    df = pd.DataFrame({'store': [0, 0, 1, 2, 2, 2, 3, 0], 'week': [0, 1, 1, 2, 3, 4, 0, 0],
+                       'region': ['n', 'n', 'n', 's', 's', 's', 's', 'n']})
+
+    store = DC(pm.Normal, name='store_effect', group='store', mu=DC(pm.Normal, name='region_effect', group='region'),
+               sigma=1e-6)
+    effect = DC(pm.Normal, name='effect', group=('store', 'week'), sparse=True, mu=store, sigma=1e-6)
+    x = effect + DataComponent(np.zeros(len(df)), 'obs', name='zero')
+    model = build(df, x)
+
+    combinations = list(df[['store', 'week']].drop_duplicates().itertuples(index=False, name=None))
+    assert effect.variable.type.shape == (len(combinations),)
+    assert model.named_vars_to_dims['effect'] == ('store:week',)
+    assert list(model.coords['store:week']) == list(map(str, combinations))
+
+    # Each row gets the effect of its own combination, drawn around the effect of its store
+    effect_value, store_value, x_value = pm.draw([effect.variable, store.variable, x.variable])
+    combination_index = [combinations.index(c) for c in df[['store', 'week']].itertuples(index=False, name=None)]
+    assert x_value == pytest.approx(effect_value[combination_index])
+    assert effect_value == pytest.approx(store_value[[s for s, _ in combinations]], abs=1e-3)
+
+
+@pytest.mark.usefixtures('simple_df')
+@pytest.mark.parametrize('parameterization', ['centered', 'noncentered'])
+def test_parameterization(simple_df, parameterization):
+    building_mu = DataComponent(np.array([-10., 10.]), group='building', name='building_mu')
+    sigma = DC(pm.HalfNormal, sigma=0.1, name='sigma')
+    rv = DC(pm.Normal, group='sensor', mu=building_mu, sigma=sigma, name='rv', parameterization=parameterization)
+
+    model = build(simple_df, rv)
+
+    free_names = [v.name for v in model.free_RVs]
+    if parameterization == 'noncentered':
+        assert 'rv_offset' in free_names and 'rv' not in free_names
+        assert 'rv' in [v.name for v in model.deterministics]
+    else:
+        assert 'rv' in free_names and 'rv_offset' not in free_names
+    assert model.named_vars_to_dims['rv'] == ('sensor',)
+
+    draws = pm.draw(rv.variable, 1000, random_seed=0)
+    assert draws.shape == (1000, 4)
+    assert draws.mean(axis=0) == pytest.approx([-10, -10, 10, 10], abs=0.05)
+
+
+@pytest.mark.usefixtures('simple_df')
+def test_auto_parameterization(simple_df):
+    sigma = DC(pm.HalfNormal, name='sigma')
+    # 5 observations per sensor, with random location, and with fixed location and scale
+    sparse_data = DC(pm.StudentT, group='sensor', nu=3, mu=DC(pm.Normal, name='mu'), sigma=sigma, name='sparse_data',
+                     parameterization='auto')
+    fixed = DC(pm.Normal, group='sensor', mu=0, sigma=1, name='fixed', parameterization='auto')
+    global_rv = DC(pm.Normal, mu=DC(pm.Normal, name='global_mu'), sigma=sigma, name='global_rv',
+                   parameterization='auto')
+
+    model = build(simple_df, sparse_data + fixed + global_rv)
+
+    assert sparse_data.noncentered
+    assert not fixed.noncentered
+    assert not global_rv.noncentered
+    assert {'sparse_data_offset', 'fixed', 'global_rv'}.issubset(v.name for v in model.free_RVs)
+
+    with pytest.raises(ValueError):
+        DC(pm.Gamma, alpha=1, beta=1, parameterization='noncentered')
+    with pytest.raises(ValueError):
+        DC(pm.Normal, tau=1, parameterization='noncentered')
+    with pytest.raises(ValueError):
+        DC(pm.Normal, parameterization='offset')
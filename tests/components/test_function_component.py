@@ -1,9 +1,12 @@
 import numpy as np
 import pytest
 import pymc as pm
+import pytensor
 import pytensor.tensor as pt
+from pytensor.tensor.subtensor import AdvancedSubtensor, AdvancedSubtensor1
 
-from sakkara.model import DistributionComponent as DC, build, f_, DataComponent
+from sakkara.model import DistributionComponent as DC, build, f_, DataComponent, DeterministicComponent
+from sakkara.model.utils import topological_order
 
 
 @pytest.mark.usefixtures('simple_df')
@@ -133,3 +136,58 @@ def test_output_group(simple_df):
     assert all(pm.draw(y.variable)[i] == 5 * 4 * (i + 1) // 2 for i in range(4))
 
 
+@pytest.mark.usefixtures('simple_df')
+def test_argument_named_by_other_argument(simple_df):
+    x = DC(pm.Normal, mu=0, sigma=1)
+    y = DC(pm.Normal, mu=x, sigma=1, name='y')
+    # Candidate component that is not part of the model
+    unused = DC(pm.Normal, name='unused')
+
+    z = DeterministicComponent('z', x + y)
+    order = topological_order(z)
+    assert order.index(y) < order.index(x)
+
+    model = build(simple_df, z)
+    assert x.get_name() == 'mu_y'
+    assert set(model.named_vars.keys()) == {'mu_y', 'y', 'z'}
+    assert unused.variable is None
+
+
+@pytest.mark.usefixtures('simple_df')
+def test_identical_functions(simple_df):
+    k = DC(pm.Normal, name='k', group='sensor')
+    x = DataComponent(np.arange(20), 'obs', name='x')
+
+    first, second = k * x, k * x
+    other = DC(pm.Normal, name='other', group='sensor') * x
+    y = DeterministicComponent('y', first + second + other + (k + x))
+    _ = build(simple_df, y)
+
+    # Structurally identical functions share the same variable, built once
+    assert first.variable is second.variable
+    assert first.variable is not other.variable
+    assert pm.draw(y.variable).shape == (20,)
+
+    # k is mapped to the observations once, although used in two different functions
+    mapped = [node for node in pytensor.graph.ancestors([y.variable]) if
+              node.owner is not None and k.variable in node.owner.inputs]
+    assert len(mapped) == 1
+
+
+@pytest.mark.usefixtures('simple_df')
+def test_gather_push_down(simple_df):
+    a = DC(pm.Normal, name='a', group='sensor')
+    b = DC(pm.Normal, name='b', group='sensor')
+    x = DataComponent(np.arange(20), 'obs', name='x')
+
+    y = DeterministicComponent('y', x * a * b + 1)
+    _ = build(simple_df, y)
+
+    # a and b are multiplied per sensor, and the product is mapped to the observations once
+    gathers = [node for node in pytensor.graph.ancestors([y.variable]) if
+               node.owner is not None and isinstance(node.owner.op, (AdvancedSubtensor, AdvancedSubtensor1))]
+    assert len(gathers) == 1
+
+    y_value, a_value, b_value = pm.draw([y.variable, a.variable, b.variable])
+    sensor = simple_df['sensor'].factorize()[0]
+    assert y_value == pytest.approx(np.arange(20) * a_value[sensor] * b_value[sensor] + 1)
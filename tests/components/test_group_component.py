@@ -1,5 +1,7 @@
+import pytensor
 import pytest
 import pymc as pm
+from pytensor.tensor.basic import Join
 
 from sakkara.model import GroupComponent as GC, DistributionComponent as DC, build
 
@@ -63,3 +65,36 @@ def test_misc_errors(simple_df):
         _ = build(simple_df, gc)
 
 
+@pytest.mark.usefixtures('simple_df')
+def test_tuple_group(simple_df):
+    members = [(b, s) for b, s in zip(simple_df['building'], simple_df['time'])]
+    gc = GC(('building', 'time'), 'gc', {m: i for i, m in enumerate(dict.fromkeys(members))})
+
+    _ = build(simple_df, gc)
+
+    assert [str(g) for g in gc.representation.get_groups()] == ['building', 'time']
+    assert pm.draw(gc.variable).tolist() == [list(range(5)), list(range(5, 10))]
+
+
+@pytest.mark.usefixtures('simple_df')
+def test_shared_components(simple_df):
+    c = DC(pm.Uniform, group='time', lower=range(5), upper=range(5))
+    gc = GC('obs', 'gc', {k: c if k % 2 else 2 * k for k in range(len(simple_df))})
+
+    _ = build(simple_df, gc)
+
+    assert pm.draw(gc.variable).tolist() == [i % 5 if i % 2 else 2 * i for i in range(len(simple_df))]
+
+
+@pytest.mark.usefixtures('simple_df')
+def test_distinct_components_size(simple_df):
+    gc = GC('obs', 'gc', {k: DC(pm.Uniform, lower=k, upper=k) for k in range(len(simple_df))})
+    x = gc + DC(pm.Uniform, 'x', lower=0, upper=0, group='sensor')
+
+    _ = build(simple_df, x)
+
+    assert pm.draw(gc.variable).tolist() == list(range(len(simple_df)))
+    # The member components are concatenated, not each mapped to all the cells of the representation
+    joins = [node for node in pytensor.graph.basic.io_toposort([], [gc.variable]) if isinstance(node.op, Join)]
+    assert len(joins) == 1
+    assert pm.draw(joins[0].outputs[0]).shape == (len(simple_df),)
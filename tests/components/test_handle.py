@@ -0,0 +1,127 @@
+import arviz as az
+import numpy as np
+import pandas as pd
+import pytest
+import pymc as pm
+
+from sakkara.model import DataComponent, DistributionComponent as DC, Likelihood, ModelHandle, data_components
+
+
+@pytest.mark.usefixtures('xdf')
+def test_set_data(xdf):
+    data = data_components(xdf)
+    k = DC(pm.Normal, name='k', group='g')
+    ll = Likelihood(pm.Normal, mu=k * data['u'], sigma=1, observed=data['y'])
+
+    handle = ModelHandle(xdf, ll)
+    logp = handle.model.compile_logp()
+    point = {'k': np.array([-1., 1.])}
+    initial_logp = logp(point)
+
+    new_df = xdf.copy()
+    new_df['y'] = 1 + new_df['u'] * new_df['k']
+    handle.set_data(new_df)
+
+    # Same compiled function, evaluated on swapped data where each residual is one
+    assert logp(point) - initial_logp == pytest.approx(-60 / 2)
+    assert all(handle.component['observed'].values == new_df['y'].values)
+
+    # The given components are left unchanged
+    assert all(data['y'].values == xdf['y'].values)
+    assert not data['y'].mutable and ll.variable is None
+
+    with handle as model:
+        assert model is handle.model
+        assert pm.modelcontext(None) is handle.model
+
+
+@pytest.mark.usefixtures('xdf')
+def test_set_masked_data(xdf):
+    xdf['y'] = xdf['y'].where(xdf.index >= 5)
+    data = data_components(xdf)
+    with pytest.warns(UserWarning):
+        ll = Likelihood(pm.Normal, mu=DC(pm.Normal, name='k', group='g') * data['u'], sigma=1, observed=data['y'],
+                        nan_param_mask={'mu': 0, 'sigma': 1}, nan_data_mask=0)
+    handle = ModelHandle(xdf, ll)
+
+    # Rows that were not observed may become observed
+    new_y = 100 + np.arange(len(xdf), dtype=float)
+    new_y[:3] = np.nan
+    handle.set_data(xdf.assign(y=new_y))
+
+    likelihood = handle.component
+    assert list(likelihood.observed_data.values) == [0] * 3 + list(new_y[3:])
+    assert list(likelihood.observed_mask.values) == [False] * 3 + [True] * (len(xdf) - 3)
+    assert list(pm.draw(handle.model['masked_y'])) == list(likelihood.observed_data.values)
+
+    with pytest.raises(ValueError):
+        handle.set_data(xdf.assign(y=np.where(xdf.index == 10, np.nan, new_y)))
+
+
+@pytest.mark.usefixtures('xdf')
+def test_invalid_data(xdf):
+    data = data_components(xdf)
+    ll = Likelihood(pm.Normal, mu=DC(pm.Normal, name='k', group='g') * data['u'], sigma=1, observed=data['y'])
+    handle = ModelHandle(xdf, ll)
+
+    with pytest.raises(ValueError):
+        handle.set_data(xdf.iloc[:-1])
+
+    with pytest.raises(ValueError):
+        handle.set_data(xdf.drop(columns='g'))
+
+    with pytest.raises(ValueError):
+        handle.set_data(xdf.assign(g=xdf['g'].replace({'a': 'c'})))
+
+    with pytest.raises(ValueError):
+        handle.set_data(xdf.assign(g=xdf['g'].values[::-1]))
+
+
+@pytest.mark.usefixtures('xdf')
+def test_predict(xdf):
+    data = data_components(xdf)
+    k = DC(pm.Normal, name='k', group='g')
+    ll = Likelihood(pm.Normal, mu=k * data['u'] + DC(pm.Normal, name='intercept'), sigma=DC(pm.HalfNormal, name='s'),
+                    observed=data['y'])
+    handle = ModelHandle(xdf, ll)
+
+    rng = np.random.default_rng(100)
+    posterior = {'k': rng.normal(size=(2, 5, 2)), 'intercept': rng.normal(size=(2, 5, 1)),
+                 's': rng.random(size=(2, 5, 1))}
+    idata = az.from_dict(posterior=posterior)
+
+    new_df = pd.DataFrame({'g': ['b', 'a', 'b'], 'u': [1., 2., 3.]}, index=[10, 11, 12])
+    predicted = handle.predict(idata, new_df)
+
+    assert predicted['mu'].dims == ('chain', 'draw', 'obs')
+    assert list(predicted['obs'].values) == [10, 11, 12]
+    expected_mu = posterior['k'][..., [1, 0, 1]] * new_df['u'].values + posterior['intercept']
+    assert predicted['mu'].values == pytest.approx(expected_mu)
+    assert predicted['sigma'].values == pytest.approx(np.broadcast_to(posterior['s'], (2, 5, 3)))
+
+    # The built model is left intact
+    assert pm.draw(handle.component.variable).shape == (60,)
+    assert pm.draw(handle.component['mu'].variable).shape == (60,)
+    assert handle.model.compile_logp()(handle.model.initial_point()) < 0
+
+    with pytest.raises(ValueError):
+        handle.predict(idata, new_df.assign(g=['a', 'b', 'c']))
+
+    with pytest.raises(ValueError):
+        handle.predict(idata, new_df.drop(columns='u'))
+
+
+@pytest.mark.usefixtures('xdf')
+def test_predict_group_likelihood(xdf):
+    k = DC(pm.Normal, name='k', group='g')
+    ll = Likelihood(pm.Normal, mu=k, sigma=1, observed=DataComponent(np.array([-1., 1.]), 'g', name='y_g'),
+                    group='g')
+    handle = ModelHandle(xdf, ll)
+
+    posterior = {'k': np.random.default_rng(100).normal(size=(2, 5, 2))}
+    predicted = handle.predict(az.from_dict(posterior=posterior), pd.DataFrame({'g': ['b']}, index=[10]))
+
+    # Coordinates of the members of the group, not of the rows
+    assert predicted['mu'].dims == ('chain', 'draw', 'g')
+    assert list(predicted['g'].values) == ['a', 'b']
+    assert predicted['mu'].values == pytest.approx(posterior['k'])
@@ -1,9 +1,13 @@
+import copy
+import pickle
+
 import numpy as np
+import pandas as pd
 import pytest
 import pymc as pm
 
 from sakkara.model import DistributionComponent as DC, build, Likelihood, DataComponent, \
-    data_components
+    data_components, FileBackedArray
 
 
 @pytest.mark.usefixtures('simple_df')
@@ -38,3 +42,47 @@ def test_nan_data(simple_df):
     assert pm.draw(ll.variable).shape == (20,)
     assert all(
         l == pytest.approx(i % 5) if i % 6 != 0 else l == pytest.approx(0) for i, l in enumerate(pm.draw(ll.variable)))
+
+
+def test_nan_data_many_rows():
+    n = 100000
+    df = pd.DataFrame({'group': np.repeat(np.arange(10), n // 10), 'y': np.tile(np.arange(10.), n // 10)})
+    df.loc[::7, 'y'] = float('Nan')
+
+    c = DC(pm.Uniform, lower=np.arange(10), upper=np.arange(10), group='group')
+
+    ll = Likelihood(pm.Normal, mu=c, sigma=1e-15, observed=data_components(df)['y'],
+                    nan_param_mask={'mu': -1, 'sigma': 1e-15}, nan_data_mask=0)
+    _ = build(df, ll)
+
+    drawn = pm.draw(ll.variable)
+    observed = np.arange(n) % 7 != 0
+    assert drawn.shape == (n,)
+    assert drawn[~observed] == pytest.approx(-np.ones(np.sum(~observed)))
+    assert drawn[observed] == pytest.approx(df['group'].values[observed])
+
+
+def test_file_backed_data(simple_df, tmp_path):
+    values = np.linspace(0, 1, 20)
+    np.save(tmp_path / 'y.npy', values)
+
+    def model(observed):
+        k = DC(pm.Normal, name='k', group='sensor')
+        return build(simple_df, Likelihood(pm.Normal, observed=observed, mu=k, sigma=1))
+
+    observed = DataComponent(np.load(tmp_path / 'y.npy', mmap_mode='r'), 'obs', 'y')
+    assert isinstance(observed.values, FileBackedArray)
+
+    file_backed_model, in_memory_model = model(observed), model(DataComponent(values, 'obs', 'y'))
+    assert observed.variable.data is observed.values
+    assert 'y' in file_backed_model.named_vars
+
+    point = in_memory_model.initial_point()
+    assert file_backed_model.compile_logp()(point) == pytest.approx(in_memory_model.compile_logp()(point))
+
+    # The array is pickled by reference to the file, and shared when copied
+    copied = pickle.loads(pickle.dumps(observed.values))
+    assert isinstance(copied, FileBackedArray) and list(copied) == list(values)
+    large = DataComponent(np.memmap(tmp_path / 'large.bin', mode='w+', shape=(10 ** 5,)), 'obs', 'large').values
+    assert len(pickle.dumps(large)) < large.nbytes / 100
+    assert copy.deepcopy(observed).values is observed.values
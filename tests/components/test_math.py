@@ -1,5 +1,6 @@
 import operator
 
+import numpy as np
 import pymc as pm
 import pytest
 
@@ -38,3 +39,36 @@ def test_operators(variables, simple_df):
     operator_test(operator.floordiv, variables, simple_df)
     operator_test(operator.pow, variables, simple_df)
     operator_test(operator.mod, variables, simple_df)
+
+
+def test_constant_folding(variables, simple_df):
+    a = variables[2]
+    x = -((a * 2) * 3 + 0 + 1 * 4)
+
+    assert x.args == (a,)
+    assert str(x.fct) == '<neg(add(mul(x0, 6), 4))>'
+    with build(simple_df, x):
+        assert pm.draw(x.variable).flatten()[0] == pytest.approx(-16)
+
+
+def test_identity_type(simple_df):
+    data = DataComponent(np.arange(len(simple_df)), 'obs', name='data')
+    as_float = data * 1.0
+    unchanged = data * 1 + 0
+
+    with build(simple_df, as_float + unchanged):
+        assert str(as_float.fct) == '<mul(x0, 1.0)>'
+        assert as_float.variable.dtype.startswith('float')
+        assert (as_float // 2).fct != (data // 2).fct
+        assert unchanged.variable is data.variable
+
+
+def test_elementwise_equality(variables):
+    a, b = variables[2], variables[3]
+
+    assert (a * 2 + b).fct == (a * 2 + b).fct
+    assert hash((a * 2 + b).fct) == hash((a * 2 + b).fct)
+    assert (a * 2).fct != (a * 3).fct
+    assert (a - b).fct == (b - a).fct and (a - b).args == (a, b) and (b - a).args == (b, a)
+    assert (a - 2).fct != (2 - a).fct
+    assert (a * a).args == (a,)
@@ -1,11 +1,18 @@
+import numpy as np
+import pandas as pd
 import pytest
 
 import pymc as pm
+import pytensor
+from pytensor.tensor.subtensor import AdvancedSubtensor, AdvancedSubtensor1
 
 from sakkara.model import data_components, DistributionComponent as DC, MinibatchLikelihood, \
     build, Likelihood, DeterministicComponent, FunctionComponent
 from sakkara.model.deterministic import MinibatchDeterministic
 from sakkara.model.minibatch import MinibatchComponent
+from sakkara.model.utils import build_graph, init_groupset
+from sakkara.relation.groupset import init
+from sakkara.relation.minibatch import StratifiedMinibatch, GroupMinibatch, ImportanceMinibatch
 
 
 @pytest.mark.usefixtures('udf', 'xdf')
@@ -51,3 +58,72 @@ def test_minibatch(udf, xdf):
     assert pm.draw(ll.variable).shape == (60,)
     assert pm.draw(predicted.variable).shape == (2, 30)
     assert pm.draw(k.variable).shape == (2,)
+
+
+@pytest.mark.parametrize('strategy, batch_size', [(StratifiedMinibatch('g'), 4),
+                                                  (StratifiedMinibatch('g', 'proportional'), 5),
+                                                  (GroupMinibatch('g'), 2),
+                                                  (ImportanceMinibatch('g', {'a': 1, 'b': 3, 'c': 6}), 4),
+                                                  (ImportanceMinibatch('obs'), 4)])
+def test_minibatch_strategies(strategy, batch_size):
+    df = pd.DataFrame({'g': ['a'] * 12 + ['b'] * 3 + ['c']})
+    df['obs'] = np.arange(len(df))
+    df['global'] = 0
+    groupset = init(df)
+    values = np.arange(len(df)) ** 2
+
+    index, weights = strategy.sample(groupset['obs'], batch_size)
+    indices, weights = pm.draw([index, weights], draws=5000, random_seed=100)
+
+    # Weighted sums of mini-batches are unbiased estimates of the full sum
+    assert np.mean(np.sum(weights * values[indices], axis=1)) == pytest.approx(values.sum(), rel=0.05)
+
+
+def test_invalid_minibatch_strategies():
+    df = pd.DataFrame({'g': ['a', 'a', 'b'], 'obs': np.arange(3), 'global': 0})
+    groupset = init(df)
+
+    with pytest.raises(ValueError):
+        StratifiedMinibatch('g').sample(groupset['obs'], 1)
+
+    with pytest.raises(ValueError):
+        StratifiedMinibatch('g', 'random')
+
+    with pytest.raises(ValueError):
+        GroupMinibatch('obs').sample(groupset['g'], 1)
+
+    with pytest.raises(ValueError):
+        ImportanceMinibatch('g', {'a': 1}).sample(groupset['obs'], 1)
+
+
+@pytest.mark.usefixtures('xdf')
+def test_weighted_minibatch_likelihood(xdf):
+    xdc = data_components(xdf)
+    k = DC(pm.Normal, name='k', group='g')
+    mbl = MinibatchLikelihood(pm.Normal, observed=xdc['y'], batch_size=4, mu=k * xdc['u'], sigma=1,
+                              strategy=StratifiedMinibatch('g'))
+    model = build(xdf, mbl)
+
+    assert 'total_size' not in mbl.subcomponents
+    assert mbl.variable in model.potentials
+    assert pm.draw(mbl['observed'].variable).shape == (4,)
+
+
+@pytest.mark.usefixtures('xdf')
+def test_minibatch_gather(xdf):
+    k = DC(pm.Normal, name='k', group='g')
+    mk = MinibatchComponent(k, 4, 'obs')
+
+    with pm.Model():
+        gs = init_groupset(xdf, mk)
+        build_graph(mk, gs)
+
+    # Only the members of the mini-batch are gathered, never all observations
+    gathered = [v for v in pytensor.graph.ancestors([mk.variable]) if
+                v.owner is not None and isinstance(v.owner.op, (AdvancedSubtensor, AdvancedSubtensor1))]
+    assert len(gathered) > 0
+    assert all(value.shape == (4,) for value in pm.draw(gathered))
+
+    k_value, index, mk_value = pm.draw([k.variable, gs['obs'].minibatch, mk.variable])
+    codes = gs['obs'].get_mapping('g')
+    assert list(mk_value) == list(k_value[codes[index]])
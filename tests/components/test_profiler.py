@@ -0,0 +1,33 @@
+import pytest
+import pymc as pm
+
+from sakkara.model import DistributionComponent as DC, Likelihood, build, data_components
+from sakkara.profiler import profile
+
+
+@pytest.mark.usefixtures('xdf')
+def test_profile_build(xdf):
+    k = DC(pm.Normal, name='k', group='g')
+    ll = Likelihood(pm.Normal, mu=k * data_components(xdf)['u'], sigma=1, observed=data_components(xdf)['y'])
+
+    with profile() as profiler:
+        _ = build(xdf, ll)
+
+    phase_df = profiler.report(per_component=False)
+    assert set(phase_df.index) == {'init', 'prebuild', 'build_representation', 'build_variable', 'mapping'}
+    assert phase_df.loc['init', 'calls'] == 1
+    assert all(phase_df['self_time'] <= phase_df['time'])
+
+    component_df = profiler.report()
+    assert component_df.loc[('DistributionComponent(k)', 'build_variable'), 'size'] == 2
+    # One byte per index, as codes of groups with few members are stored as int8
+    assert component_df.loc[("('g',) -> ('obs',)", 'mapping'), 'size'] == 60
+    # Subcomponents are built before the likelihood
+    built = [(r.phase, r.component) for r in profiler.records]
+    assert built.index(('build_variable', 'DistributionComponent(k)')) < built.index(
+        ('prebuild', 'Likelihood(likelihood)'))
+
+    # Nothing is recorded outside of the context
+    ll.clear()
+    _ = build(xdf, ll)
+    assert profiler.report(per_component=False).loc['init', 'calls'] == 1
@@ -1,9 +1,12 @@
+import itertools
+
 import numpy as np
 import numpy.typing as npt
 import pandas as pd
 import pytest
 
-from sakkara.relation import groupset
+from sakkara.relation import groupset, representation
+from sakkara.relation.groupset_cache import GroupSetCache
 from sakkara.relation.representation import Representation, MinimalTensorRepresentation as TR
 
 """
@@ -245,3 +248,223 @@ def test_mapping(df, gs, graph_dict):
             test_permuted_representation(ko, TR(gs[k], gs[other_name]), ok, TR(gs[other_name], gs[k]))
 
         test_permuted_representation(np.arange(4), TR(gs['d']), np.arange(4).reshape(2, 2), TR(gs['a'], gs['e']))
+
+
+def test_mapping_cache(df, gs):
+    source, target = TR(gs['a']), TR(gs['c'], gs['e'])
+
+    mapped = source.map(df['a'].unique(), target)
+    assert gs.mapping_cache.misses == 1
+    assert len(gs.mapping_cache) == 1
+
+    assert all(source.map(df['a'].unique(), target).ravel() == mapped.ravel())
+    assert gs.mapping_cache.hits == 1
+    assert len(gs.mapping_cache) == 1
+
+    # Evict least recently used mapping when memory bound is exceeded
+    gs.mapping_cache.max_bytes = gs.mapping_cache.nbytes
+    _ = TR(gs['b']).map(df['b'].unique(), TR(gs['c']))
+    assert len(gs.mapping_cache) == 1
+    assert (('b',), ('c',)) in gs.mapping_cache
+    assert (('a',), ('c', 'e')) not in gs.mapping_cache
+
+
+def test_determination_df(df):
+    codes = groupset.factorize(df)
+    for k in df:
+        assert list(df[k].iloc[groupset.get_first_indices(codes[k])]) == list(df[k].unique())
+        assert list(codes[k][groupset.get_first_indices(codes[k])]) == list(range(df[k].nunique()))
+
+    determination_df = groupset.get_determination_df(codes)
+    # Every group determines the global group, and the observation group determines every group
+    assert all(determination_df.loc[list('abcdeo'), 'g'])
+    assert all(determination_df.loc['o', list('gabcde')])
+    assert determination_df.loc['c', 'b'] and not determination_df.loc['b', 'c']
+    assert determination_df.loc['d', 'e'] and not determination_df.loc['e', 'd']
+    assert not determination_df.loc['b', 'd'] and not determination_df.loc['d', 'b']
+    assert not any(determination_df.loc[k, k] for k in df)
+
+
+def test_builtin_groups(df):
+    builtin_gs = groupset.init(df.drop(columns=['g', 'o']), builtin_groups=True)
+
+    # Built-in groups have the same relations as the corresponding columns
+    names = {'g': 'global', 'o': 'obs'}
+    gs = groupset.init(df)
+    for k, group in gs.groups.items():
+        builtin_group = builtin_gs[names.get(k, k)]
+        for relation in ['parents', 'children', 'twins']:
+            assert {names.get(g.name, g.name) for g in getattr(group, relation)} == {
+                g.name for g in getattr(builtin_group, relation)}
+        for parent in group.parents:
+            assert list(builtin_group.get_mapping(names.get(parent.name, parent.name))) == list(
+                group.get_mapping(parent.name))
+
+    assert isinstance(builtin_gs['obs'].members, pd.RangeIndex)
+    assert len(builtin_gs['obs']) == len(df)
+    assert list(builtin_gs['obs'].get_mapping('obs')) == list(range(len(df)))
+    assert builtin_gs['obs'].get_mapping('c').dtype == np.int8
+
+
+def test_builtin_global_group(df):
+    df['constant'] = 'c'
+    gs = groupset.init(df.drop(columns=['g', 'o']), builtin_groups=True)
+
+    # Global is a parent of every group, without storing the mapping
+    for k in list('abcde') + ['obs']:
+        assert gs['global'] in gs[k].parents
+        assert 'global' not in gs[k].mapping
+        assert list(gs[k].get_mapping('global')) == [0] * len(gs[k])
+
+    assert gs['constant'] in gs['global'].twins
+    assert gs['global'] in gs['constant'].twins
+    assert gs['constant'] in gs['obs'].parents
+
+
+def test_combination_mapping():
+    crossed = pd.DataFrame(list(itertools.product(range(2), range(3), range(4))), columns=list('abc'))
+    crossed = crossed.sample(frac=1, random_state=100)
+    crossed['cell'] = crossed['a'] * 100 + crossed['b'] * 10 + crossed['c']
+    # Parent of cell whose size divides the number of cells, but that does not identify any of a, b and c
+    crossed['e'] = (crossed['b'] == 0) & (crossed['c'] == 0)
+
+    gs = groupset.init(crossed, builtin_groups=True)
+    source = TR(gs['cell'])
+    target = TR(gs['e'], gs['b'], gs['c'], gs['a'])
+
+    assert representation.one_to_combination_mapping(gs['cell'], target) == (gs['b'], gs['c'], gs['a'])
+
+    mapped = source.map(gs['cell'].members, target)
+    assert mapped.shape == (2, 3, 4, 2)
+    for (i, j, k, m), member in np.ndenumerate(mapped):
+        assert member == gs['a'].members[m] * 100 + gs['b'].members[j] * 10 + gs['c'].members[k]
+    assert ('combination', 'cell', ('e', 'b', 'c', 'a')) in gs.mapping_cache
+
+    # Combinations of parents without a member can not be mapped
+    partial = groupset.init(crossed.iloc[1:], builtin_groups=True)
+    with pytest.raises(ValueError):
+        TR(partial['cell']).map(partial['cell'].members, TR(partial['a'], partial['b'], partial['c']))
+
+
+def test_groupset_cache(df, tmp_path):
+    cache = GroupSetCache(max_entries=1, directory=str(tmp_path))
+    columns = list('abcde')
+
+    gs = cache.get(df, columns, builtin_groups=True)
+    assert cache.misses == 1
+
+    # Same group columns, but other columns changed
+    df['o'] = df['o'] * 2
+    copied = cache.get(df, columns, builtin_groups=True)
+    assert cache.hits == 1
+
+    # The copy has new groups with the same relations and mappings
+    for k, group in gs.groups.items():
+        assert copied[k] is not group
+        for relation in ['parents', 'children', 'twins']:
+            assert {g.name for g in getattr(group, relation)} == {g.name for g in getattr(copied[k], relation)}
+            assert all(g is copied[g.name] for g in getattr(copied[k], relation))
+        assert all(copied[k].mapping[p] is group.mapping[p] for p in group.mapping)
+    assert copied.mapping_cache is not gs.mapping_cache
+
+    # Changed group column
+    df['e'] = 1 - df['e']
+    _ = cache.get(df, columns, builtin_groups=True)
+    assert cache.misses == 2 and len(cache) == 1
+
+    # Group sets are reused from disk
+    df['e'] = 1 - df['e']
+    disk_cache = GroupSetCache(directory=str(tmp_path))
+    loaded = disk_cache.get(df, columns, builtin_groups=True)
+    assert disk_cache.hits == 1 and disk_cache.misses == 0
+    assert list(loaded['obs'].get_mapping('d')) == list(gs['obs'].get_mapping('d'))
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_load(df, tmp_path, mmap):
+    df['constant'] = 'c'
+    gs = groupset.init(df.drop(columns=['g', 'o']), builtin_groups=True)
+    gs.save(str(tmp_path / 'groupset.npz'))
+    loaded = groupset.GroupSet.load(str(tmp_path / 'groupset.npz'), mmap=mmap)
+
+    assert list(loaded.groups) == list(gs.groups)
+    for k, group in gs.groups.items():
+        assert loaded[k].name == group.name
+        assert list(loaded[k].members) == list(group.members)
+        for relation in ['parents', 'children', 'twins']:
+            assert {g.name for g in getattr(group, relation)} == {g.name for g in getattr(loaded[k], relation)}
+        assert set(loaded[k].mapping) == set(group.mapping)
+        for parent_name, mapping in group.mapping.items():
+            assert loaded[k].mapping[parent_name].dtype == mapping.dtype
+            assert list(loaded[k].mapping[parent_name]) == list(mapping)
+            assert isinstance(loaded[k].mapping[parent_name], np.memmap) == mmap
+
+    assert isinstance(loaded['obs'].members, pd.RangeIndex)
+    assert loaded.mapping_cache is not gs.mapping_cache
+    mapped = TR(gs['a']).map(np.arange(2), TR(gs['c'], gs['e']))
+    loaded_mapped = TR(loaded['a']).map(np.arange(2), TR(loaded['c'], loaded['e']))
+    assert list(loaded_mapped.ravel()) == list(mapped.ravel())
+
+
+def test_load_pickled(df, tmp_path):
+    # Members of mixed types are pickled when saved
+    df['a'] = df['a'].map({'0': 0, '1': 'one'})
+    gs = groupset.init(df[list('abc')], builtin_groups=True)
+    gs.save(str(tmp_path / 'groupset.npz'))
+
+    with pytest.raises(ValueError):
+        groupset.GroupSet.load(str(tmp_path / 'groupset.npz'))
+    loaded = groupset.GroupSet.load(str(tmp_path / 'groupset.npz'), allow_pickle=True)
+    assert list(loaded['a'].members) == [0, 'one']
+
+    # Such group sets are only cached in memory, unless pickling is allowed
+    cache = GroupSetCache(directory=str(tmp_path / 'cache'))
+    _ = cache.get(df, list('abc'), builtin_groups=True)
+    assert len(list((tmp_path / 'cache').iterdir())) == 0
+    cache = GroupSetCache(directory=str(tmp_path / 'cache'), allow_pickle=True)
+    _ = cache.get(df, list('abc'), builtin_groups=True)
+    cache.clear()
+    _ = cache.get(df, list('abc'), builtin_groups=True)
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_init_chunks(df):
+    chunks = [df.iloc[:5], df.iloc[5:5], df.iloc[5:20], df.iloc[20:]]
+    gs = groupset.init(df.drop(columns=['g', 'o']), builtin_groups=True)
+    chunked_gs = groupset.init_chunks(iter(chunks), list('abcde'), builtin_groups=True)
+
+    assert list(chunked_gs.groups) == list(gs.groups)
+    for k, group in gs.groups.items():
+        assert list(chunked_gs[k].members) == list(group.members)
+        for relation in ['parents', 'children', 'twins']:
+            assert {g.name for g in getattr(group, relation)} == {g.name for g in getattr(chunked_gs[k], relation)}
+        for parent_name, mapping in group.mapping.items():
+            assert chunked_gs[k].mapping[parent_name].dtype == mapping.dtype
+            assert list(chunked_gs[k].mapping[parent_name]) == list(mapping)
+
+
+def test_get_combination(df, tmp_path):
+    gs = groupset.init(df.drop(columns=['g', 'o']), builtin_groups=True)
+    combination = gs.get_combination(['b', 'e'])
+
+    observed = list(dict.fromkeys(zip(df['b'], df['e'])))
+    assert combination.name == 'b:e'
+    assert list(combination.members) == observed
+    assert gs.get_combination(['b', 'e']) is combination
+    assert {g.name for g in combination.parents} >= {'global', 'a', 'b', 'e'}
+    assert combination in gs['obs'].parents
+
+    # Values per combination are mapped to the rows with that combination
+    values = np.arange(len(observed))
+    mapped = TR(combination).map(values, TR(gs['obs']))
+    assert list(mapped) == [observed.index(k) for k in zip(df['b'], df['e'])]
+
+    # Values per member of a combined group are mapped to the combinations containing it
+    mapped = TR(gs['b']).map(np.arange(4), TR(combination))
+    assert list(mapped) == [int(b) for b, _ in observed]
+
+    gs.save(str(tmp_path / 'groupset.npz'))
+    loaded = groupset.GroupSet.load(str(tmp_path / 'groupset.npz'))
+    assert loaded['b:e'].combination == ('b', 'e')
+    assert list(loaded['b:e'].members) == observed
+    assert list(loaded.coords()['b:e']) == [str(k) for k in observed]
@@ -1,8 +1,11 @@
+import numpy as np
+import pandas as pd
 import pytest
 import pymc as pm
 
 from sakkara.model import data_components, DistributionComponent as DC, MinibatchLikelihood, build, \
-    DeterministicComponent
+    DeterministicComponent, ingest_chunks
+from sakkara.relation.minibatch import StratifiedMinibatch
 
 
 @pytest.mark.usefixtures('udf', 'xdf')
@@ -22,3 +25,52 @@ def test_hierarchical_minibatch(udf, xdf):
     k_posterior = idata.posterior['k'].to_dataframe().reset_index()
     assert k_posterior.loc[k_posterior.g == 'a', 'k'].mean() == pytest.approx(-1, abs=1e-2)
     assert k_posterior.loc[k_posterior.g == 'b', 'k'].mean() == pytest.approx(1, abs=1e-2)
+
+
+@pytest.mark.usefixtures('udf', 'xdf')
+def test_stratified_minibatch(udf, xdf):
+    # Imbalanced groups, where the small group would rarely be seen with uniform mini-batches
+    xdf = xdf[(xdf.g == 'a') | (xdf.time < 3)]
+    xdc = data_components(xdf)
+
+    k = DC(pm.Normal, name='k', group='g')
+    mbl = MinibatchLikelihood(pm.Normal, observed=xdc['y'], batch_size=4, mu=k * xdc['u'], sigma=1e-2,
+                              strategy=StratifiedMinibatch('g'))
+
+    model = build(xdf, mbl)
+    approx = pm.fit(model=model, n=10000, random_seed=100)
+
+    idata = approx.sample(10000, random_seed=100)
+
+    k_posterior = idata.posterior['k'].to_dataframe().reset_index()
+    assert k_posterior.loc[k_posterior.g == 'a', 'k'].mean() == pytest.approx(-1, abs=5e-2)
+    assert k_posterior.loc[k_posterior.g == 'b', 'k'].mean() == pytest.approx(1, abs=5e-2)
+
+
+@pytest.mark.usefixtures('udf', 'xdf')
+def test_ingest_chunks(udf, xdf, tmp_path):
+    chunks = (xdf.iloc[i:i + 7] for i in range(0, len(xdf), 7))
+    groupset, xdc = ingest_chunks(chunks, ['g', 'time'], ['u', 'y'], str(tmp_path))
+    assert isinstance(xdc['y'].values, np.memmap)
+    assert list(xdc['y'].values) == list(xdf['y'])
+
+    k = DC(pm.Normal, name='k', group='g')
+    mbl = MinibatchLikelihood(pm.Normal, observed=xdc['y'], batch_size=10, mu=k * xdc['u'], sigma=1e-15)
+
+    model = build(groupset, mbl)
+    approx = pm.fit(model=model, n=10000, random_seed=100)
+    idata = approx.sample(10000, random_seed=100)
+
+    k_posterior = idata.posterior['k'].to_dataframe().reset_index()
+    assert k_posterior.loc[k_posterior.g == 'a', 'k'].mean() == pytest.approx(-1, abs=1e-2)
+    assert k_posterior.loc[k_posterior.g == 'b', 'k'].mean() == pytest.approx(1, abs=1e-2)
+
+
+def test_ingest_promoted_chunks(tmp_path):
+    (tmp_path / 'data.csv').write_text('g,x\na,1\nb,2\na,\nb,4\n')
+    chunks = pd.read_csv(tmp_path / 'data.csv', chunksize=2)
+    groupset, dc = ingest_chunks(chunks, ['g'], ['x'], str(tmp_path / 'data'))
+
+    # The integer column is promoted to float by the missing value in the second chunk
+    assert dc['x'].values.dtype == np.float64
+    assert list(dc['x'].values[[0, 1, 3]]) == [1, 2, 4] and np.isnan(dc['x'].values[2])
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pymc as pm
+import pytensor.tensor as pt
+import pytest
+
+from sakkara.model import DistributionComponent as DC, Likelihood, MinibatchLikelihood, build, build_many, clone, \
+    data_components, fit_many
+from sakkara.model.parallel import bind_data
+
+
+def sample_prior(model):
+    return pm.sample_prior_predictive(samples=10, model=model, random_seed=100)
+
+
+@pytest.fixture
+def unit_dfs():
+    return {unit: pd.DataFrame({'g': np.repeat(['a', 'b'], 5), 'x': np.arange(10.), 'y': unit * np.arange(10.)})
+            for unit in range(4)}
+
+
+@pytest.fixture
+def likelihood(unit_dfs):
+    dc = data_components(unit_dfs[0])
+    k = DC(pm.Normal, name='k', group='g')
+    return Likelihood(pm.Normal, observed=dc['y'], mu=k * dc['x'], sigma=1)
+
+
+def test_clone(simple_df):
+    k = DC(pm.Normal, name='k', group='sensor')
+    _ = build(simple_df, k)
+
+    copied = clone(k)
+    assert copied.variable is None and copied.representation is None
+
+    # The copy is built independently of the original
+    _ = build(simple_df, copied)
+    assert copied.variable is not k.variable
+
+
+def test_clone_tensor_constant(simple_df):
+    k = DC(pm.Normal, 'k', mu=pt.constant(3.0), sigma=1e-15)
+    unbuilt_copy = clone(k)
+    _ = build(simple_df, k)
+    built_copy = clone(k)
+
+    # The constant is kept, also when it is the variable of the built original
+    for copied in [unbuilt_copy, built_copy]:
+        assert copied['mu'].values is not None and copied['mu'].variable is None
+        _ = build(simple_df, copied)
+        assert pm.draw(copied.variable) == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_fit_many(unit_dfs, likelihood, n_jobs):
+    results = dict(fit_many(unit_dfs, likelihood, sample_prior, n_jobs=n_jobs, max_pending=2))
+
+    assert sorted(results) == list(unit_dfs)
+    for unit, idata in results.items():
+        # Each unit is fitted with its own observed data
+        assert np.allclose(idata.observed_data['likelihood'].values, unit * np.arange(10.))
+    assert likelihood.variable is None
+
+
+def test_build_many(unit_dfs, likelihood):
+    models = dict(build_many(iter(unit_dfs.items()), likelihood, n_jobs=2))
+
+    assert sorted(models) == list(unit_dfs)
+    assert all(set(model.named_vars).issuperset({'k', 'likelihood'}) for model in models.values())
+
+
+def test_bind_masked_data(unit_dfs):
+    dfs = {unit: df.assign(y=df['y'].where(df.index != unit)) for unit, df in unit_dfs.items()}
+    dc = data_components(dfs[1])
+    k = DC(pm.Normal, name='k', group='g')
+    with pytest.warns(UserWarning):
+        likelihood = Likelihood(pm.Normal, observed=dc['y'], mu=k * dc['x'], sigma=1,
+                                nan_param_mask={'mu': 0, 'sigma': 1}, nan_data_mask=0)
+
+    bound = bind_data(likelihood, dfs[2])
+    assert list(bound.observed_data.values) == list(dfs[2]['y'].fillna(0))
+    assert list(bound.observed_mask.values) == list(dfs[2]['y'].notna())
+    assert list(likelihood.observed_data.values) == list(dfs[1]['y'].fillna(0))
+
+    with pytest.raises(ValueError):
+        bind_data(likelihood, dfs[2].drop(columns='y'))
+
+
+def test_bind_minibatch_data(unit_dfs):
+    dc = data_components(unit_dfs[1])
+    likelihood = MinibatchLikelihood(pm.Normal, observed=dc['y'], batch_size=2, mu=DC(pm.Normal, name='k') * dc['x'],
+                                     sigma=1)
+
+    bound = bind_data(likelihood, unit_dfs[2].iloc[:6])
+    # The log-likelihood is scaled by the size of the bound data
+    assert bound['total_size'].values == 6
+    assert list(bound.observed_data.values) == list(unit_dfs[2]['y'].iloc[:6])
+    assert likelihood['total_size'].values == 10